@@ -1,105 +1,245 @@
-from flask import Flask, request, jsonify
+from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_migrate import Migrate
+from flask_jwt_extended import JWTManager
 from flask_bcrypt import Bcrypt
 from datetime import timedelta
 from flask_cors import CORS
+import click
 import os
-import sys
 
 
 from dotenv import load_dotenv
 load_dotenv()
 
-database_url = None
-
-# Inicializar Flask
-app = Flask(__name__)
-
-CORS(app, resources={r"/api/*": {
-    "origins": [
-        "https://djengua.com",
-        "http://localhost:8081",
-        "http://localhost",
-        "http://10.3.12.240:8081"
-        ],
-    "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    "allow_headers": ["Content-Type", "Authorization"]
-}})
-
-database_url = os.environ.get('DATABASE_URL')
-
-if database_url:
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
-
-    print("Usando URL de base de datos desde variables de entorno: OK")
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    # Configuración manual como respaldo
-    print("No se encontró DATABASE_URL, usando configuración manual")
-    DB_USER = os.environ.get('DB_USER', 'postgres')
-    DB_PASS = os.environ.get('DB_PASS', 'postgres')
-    DB_HOST = os.environ.get('DB_HOST', 'localhost')
-    DB_PORT = os.environ.get('DB_PORT', '5432')
-    DB_NAME = os.environ.get('DB_NAME', 'user_api')
-
-    manual_url = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
-    print("URL manual: OK")
-    app.config['SQLALCHEMY_DATABASE_URI'] = manual_url
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.environ.get(
-    'JWT_SECRET_KEY', 'super-secret-key-change-in-production')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-
-print("URL final de base de datos: OK")
-
-# Inicializar extensiones
-db = SQLAlchemy(app)
-jwt = JWTManager(app)
-migrate = Migrate(app, db)
-bcrypt = Bcrypt(app)
-
-
-@app.route('/')
-def home():
-    return jsonify({'message': 'Welcome to the User Management API'}), 200
-
-
-@app.route('/routes')
-def list_routes():
-    routes = []
-    for rule in app.url_map.iter_rules():
-        routes.append({
-            'endpoint': rule.endpoint,
-            'methods': list(rule.methods),
-            'path': str(rule)
-        })
-    return jsonify(routes), 200
+# Extensiones sin app; create_app las enlaza. Los módulos siguen usando
+# `from app import db` como antes.
+db = SQLAlchemy()
+jwt = JWTManager()
+bcrypt = Bcrypt()
+
+
+def _load_config(app):
+    """Configuración a partir de las variables de entorno"""
+    database_url = os.environ.get('DATABASE_URL')
+
+    if database_url:
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+        app.logger.debug('Usando URL de base de datos desde DATABASE_URL')
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    else:
+        # Configuración manual como respaldo
+        app.logger.debug('No se encontró DATABASE_URL, usando configuración manual')
+        DB_USER = os.environ.get('DB_USER', 'postgres')
+        DB_PASS = os.environ.get('DB_PASS', 'postgres')
+        DB_HOST = os.environ.get('DB_HOST', 'localhost')
+        DB_PORT = os.environ.get('DB_PORT', '5432')
+        DB_NAME = os.environ.get('DB_NAME', 'user_api')
+
+        manual_url = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+        app.config['SQLALCHEMY_DATABASE_URI'] = manual_url
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = os.environ.get(
+        'JWT_SECRET_KEY', 'super-secret-key-change-in-production')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    # Zona horaria en la que se escriben las fechas de todas las respuestas JSON
+    app.config['JSON_OUTPUT_TIMEZONE'] = os.environ.get('JSON_OUTPUT_TIMEZONE', 'America/Mexico_City')
+    # Segundos máximos que un worker puede servir el catálogo de compañías sin revalidarlo
+    app.config['COMPANY_CACHE_MAX_STALENESS'] = float(os.environ.get('COMPANY_CACHE_MAX_STALENESS', 5))
+    # Segundos máximos que un token con permisos revocados puede seguir valiendo en un worker
+    app.config['CLAIMS_CACHE_MAX_STALENESS'] = float(os.environ.get('CLAIMS_CACHE_MAX_STALENESS', 5))
+    # Política de hash de contraseñas: esquema (bcrypt o argon2) y su costo.
+    # `flask passwords calibrate` mide esta máquina y sugiere el costo para PASSWORD_HASH_TARGET_MS
+    app.config['PASSWORD_HASH_SCHEME'] = os.environ.get('PASSWORD_HASH_SCHEME', 'bcrypt')
+    app.config['PASSWORD_HASH_TARGET_MS'] = int(os.environ.get('PASSWORD_HASH_TARGET_MS', 250))
+    app.config['PASSWORD_HASH_AUTOCALIBRATE'] = os.environ.get(
+        'PASSWORD_HASH_AUTOCALIBRATE', 'false').lower() in ('1', 'true', 'yes')
+    # Costo calibrado que comparten todos los workers (`flask passwords calibrate --save`
+    # o el primer arranque con PASSWORD_HASH_AUTOCALIBRATE)
+    app.config['PASSWORD_HASH_CALIBRATION_FILE'] = os.environ.get(
+        'PASSWORD_HASH_CALIBRATION_FILE', os.path.join(app.instance_path, 'password_hash_cost.json'))
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    app.config['ARGON2_TIME_COST'] = int(os.environ.get('ARGON2_TIME_COST', 3))
+    app.config['ARGON2_MEMORY_COST'] = int(os.environ.get('ARGON2_MEMORY_COST', 65536))
+    app.config['ARGON2_PARALLELISM'] = int(os.environ.get('ARGON2_PARALLELISM', 1))
+    # Pool de hilos para bcrypt: tamaño y cuántas solicitudes pueden esperar antes de responder 503
+    app.config['PASSWORD_POOL_WORKERS'] = int(os.environ.get('PASSWORD_POOL_WORKERS', 2))
+    app.config['PASSWORD_POOL_MAX_QUEUE'] = int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', 8))
+    app.config['PASSWORD_POOL_RETRY_AFTER'] = int(os.environ.get('PASSWORD_POOL_RETRY_AFTER', 1))
+    app.config['PASSWORD_POOL_BULK_WAIT'] = float(os.environ.get('PASSWORD_POOL_BULK_WAIT', 5))
+    # Límite de solicitudes compartido entre workers (archivo SQLite local)
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get(
+        'RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['RATE_LIMIT_STORAGE'] = os.environ.get('RATE_LIMIT_STORAGE')
+    # Proxies delante de la app cuyo X-Forwarded-For se usa para la IP del cliente.
+    # Detrás del proxy de Railway debe ser 1 (Railway.toml); con 0 todos los
+    # clientes comparten la IP del proxy y la misma cubeta
+    app.config['RATE_LIMIT_TRUSTED_PROXIES'] = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0))
+    # Las listas completas (/all sin paginación) se envían en pedazos
+    app.config['STREAM_LIST_RESPONSES'] = os.environ.get(
+        'STREAM_LIST_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+    # Trabajos en segundo plano: `thread` los corre un pool dentro de cada proceso web,
+    # `external` solo los encola y los ejecuta `flask worker`
+    app.config['JOB_RUNNER'] = os.environ.get('JOB_RUNNER', 'thread')
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+    app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+    app.config['JOB_STALE_AFTER'] = int(os.environ.get('JOB_STALE_AFTER', 300))
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    app.config['JOB_MAX_PAYLOAD_BYTES'] = int(os.environ.get('JOB_MAX_PAYLOAD_BYTES', 20 * 1024 * 1024))
+    # Máximo de trabajos de cada tipo corriendo a la vez (entre todos los workers)
+    app.config['JOB_CONCURRENCY'] = {'import_companies': 1, 'bulk_users': 1, 'move_members': 1}
+    # Instrumentación de SQL por request (consultas, tiempo, repetidas, Server-Timing)
+    app.config['SQL_INSTRUMENTATION'] = os.environ.get(
+        'SQL_INSTRUMENTATION', 'true').lower() in ('1', 'true', 'yes')
+    app.config['SQL_SAMPLE_RATE'] = float(os.environ.get('SQL_SAMPLE_RATE', 1.0))
+    app.config['SQL_QUERY_BUDGET'] = int(os.environ.get('SQL_QUERY_BUDGET', 20))
+    app.config['SQL_QUERY_BUDGET_STRICT'] = os.environ.get(
+        'SQL_QUERY_BUDGET_STRICT', 'false').lower() in ('1', 'true', 'yes')
+    app.config['SQL_REPEAT_THRESHOLD'] = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))
+    # Métricas en formato Prometheus en /metrics (requiere prometheus_client)
+    app.config['METRICS_ENABLED'] = os.environ.get(
+        'METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Búsqueda: `auto` usa SQL con índices de trigramas en Postgres y un índice en
+    # memoria (por worker) en los demás motores; `database` o `memory` lo fuerzan
+    app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'auto')
+    app.config['SEARCH_INDEX_MAX_STALENESS'] = float(os.environ.get('SEARCH_INDEX_MAX_STALENESS', 5))
+
+
+def create_app(config=None):
+    """
+    Crea la app. `config` (dict) se aplica sobre la configuración del entorno,
+    p. ej. {'SQLALCHEMY_DATABASE_URI': 'sqlite://'} para pruebas.
+
+    No toca la base de datos: las tablas y los roles base se crean una sola vez
+    con `flask db upgrade` (o `flask init-db` en desarrollo), no en cada arranque de worker.
+    Flask-Migrate (alembic) solo se carga cuando la app se crea desde el CLI.
+    """
+    # Inicializar Flask
+    app = Flask(__name__)
+
+    CORS(app, resources={r"/api/*": {
+        "origins": [
+            "https://djengua.com",
+            "http://localhost:8081",
+            "http://localhost",
+            "http://10.3.12.240:8081"
+            ],
+        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization"]
+    }})
+
+    _load_config(app)
+    if config:
+        app.config.update(config)
+
+    # Pool de conexiones según procesos/hilos del servidor (ver app/utils/db_pool.py)
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        from app.utils.db_pool import engine_options_from_env
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(
+            app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Serialización JSON (orjson si está disponible) para jsonify y streaming
+    from app.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    # Inicializar extensiones
+    db.init_app(app)
+    jwt.init_app(app)
+    bcrypt.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from app.utils.db_pool import pool_telemetry
+    from app.utils.instrumentation import init_instrumentation
+    from app.utils.metrics import init_metrics
+    with app.app_context():
+        pool_telemetry.attach(db.engine)
+        init_instrumentation(app, db.engine)
+    init_metrics(app)
+
+    from app.utils.passwords import HashPoolSaturated
+
+    @app.errorhandler(HashPoolSaturated)
+    def password_pool_saturated(e):
+        response = jsonify({'message': 'El servidor está ocupado, intenta de nuevo en unos segundos'})
+        response.headers['Retry-After'] = str(app.config['PASSWORD_POOL_RETRY_AFTER'])
+        return response, 503
+
+    @app.route('/')
+    def home():
+        return jsonify({'message': 'Welcome to the User Management API'}), 200
+
+    @app.route('/routes')
+    def list_routes():
+        routes = []
+        for rule in app.url_map.iter_rules():
+            routes.append({
+                'endpoint': rule.endpoint,
+                'methods': list(rule.methods),
+                'path': str(rule)
+            })
+        return jsonify(routes), 200
+
+    register_blueprints(app)
+    register_commands(app)
+
+    # Ajustar el costo del hash a esta máquina si se pidió al arrancar (una vez por máquina)
+    if app.config['PASSWORD_HASH_AUTOCALIBRATE']:
+        from app.utils.passwords import apply_calibration
+        cost, timings = apply_calibration(app, app.config['PASSWORD_HASH_TARGET_MS'])
+        app.logger.info(f"Costo de hash {'calibrado' if timings else 'guardado'}: {cost}")
+
+    return app
 
 
 def init_db():
-    with app.app_context():
-        # Importar todos los modelos aquí
-        from app.models.roles import Role
-        from app.models.users import User
-        from app.models.companies import Company
+    """Crea las tablas que falten y los roles base (paso único, `flask init-db`)"""
+    # Importar todos los modelos aquí
+    from app.models.roles import Role
+    from app.models.users import User
+    from app.models.companies import Company
+    from app.models.cache_versions import CacheVersion
+    from app.models.jobs import Job
 
-        # Crear todas las tablas
-        db.create_all()
-        Role.init_roles(db.session)
-        print("Base de datos inicializada correctamente")
+    # Crear todas las tablas
+    db.create_all()
+    Role.init_roles(db.session)
 
 
-def register_blueprints():
+def register_blueprints(app):
     from app.routes.auth import auth_bp
     from app.routes.user import users_bp
     from app.routes.companies import companies_bp
+    from app.routes.jobs import jobs_bp
+    from app.routes.admin import admin_bp
     # Si tienes blueprint de usuarios, también lo importarías aquí
     # from app.routes.users import users_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(users_bp, url_prefix='/api/users')
     app.register_blueprint(companies_bp, url_prefix='/api/companies')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+
+def register_commands(app):
+    # Comandos de `flask` propios de la app
+    from app.cli import (
+        bench_cli, companies_cli, init_db_command, passwords_cli, seed_command, worker_command
+    )
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(passwords_cli)
+    app.cli.add_command(companies_cli)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(bench_cli)
+
+    # `flask db advise` va junto a los comandos de Flask-Migrate (solo desde el CLI)
+    if 'migrate' in app.extensions:
+        from flask_migrate.cli import db as db_cli
+        from app.cli import advise_command
+        db_cli.add_command(advise_command)
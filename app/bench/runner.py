@@ -0,0 +1,311 @@
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from app.bench.seed import ADMIN_EMAIL, SUPERADMIN_EMAIL
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+# Usuarios normales que `prepare` junta para los pasos de lectura y escritura
+USER_SAMPLE_SIZE = 500
+
+
+class BenchContext:
+    """Tokens e ids que los pasos usan para armar sus requests"""
+
+    def __init__(self, password):
+        self.password = password
+        self.superadmin_token = None
+        self.admin_token = None
+        self.user_tokens = []
+        self.user_emails = []
+        self.user_ids = []
+        self.company_ids = []
+
+
+# Cada paso regresa (método, ruta, cuerpo JSON, token)
+def step_login(ctx, rng):
+    return 'POST', '/api/login', {'email': rng.choice(ctx.user_emails), 'password': ctx.password}, None
+
+
+def step_me(ctx, rng):
+    return 'GET', '/api/users/me', None, rng.choice(ctx.user_tokens)
+
+
+def step_users_page(ctx, rng):
+    return 'GET', '/api/users/all?limit=50', None, ctx.admin_token
+
+
+def step_users_all(ctx, rng):
+    return 'GET', '/api/users/all', None, ctx.admin_token
+
+
+def step_companies_all(ctx, rng):
+    return 'GET', '/api/companies/all', None, rng.choice(ctx.user_tokens)
+
+
+def step_create_user(ctx, rng):
+    return 'POST', '/api/users/create', {
+        'email': f'new-{uuid.uuid4().hex[:12]}@bench.test',
+        'password': ctx.password,
+        'companies': [rng.choice(ctx.company_ids)]
+    }, ctx.superadmin_token
+
+
+def step_update_user(ctx, rng):
+    return 'PUT', f'/api/users/{rng.choice(ctx.user_ids)}', {
+        'name': f'Bench {rng.randint(1, 1000)}'
+    }, ctx.superadmin_token
+
+
+STEPS = {
+    'login': step_login,
+    'me': step_me,
+    'users_page': step_users_page,
+    'users_all': step_users_all,
+    'companies_all': step_companies_all,
+    'create_user': step_create_user,
+    'update_user': step_update_user
+}
+
+# Escenario -> {paso: peso}
+SCENARIOS = {
+    'read': {'me': 50, 'companies_all': 30, 'users_page': 20},
+    'login': {'login': 100},
+    'list': {'users_all': 50, 'companies_all': 50},
+    'write': {'create_user': 50, 'update_user': 50},
+    'mixed': {'me': 40, 'companies_all': 20, 'users_page': 15, 'login': 10,
+              'create_user': 10, 'update_user': 5}
+}
+
+
+class _Client:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.connection = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(body)
+        if self.connection is None:
+            self.connection = self.connection_class(self.host, self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        return response.status, response.getheader('Server-Timing'), data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def _login(client, email, password):
+    status, _, data = client.request('POST', '/api/login', {'email': email, 'password': password})
+    if status != 200:
+        raise RuntimeError(f'No se pudo iniciar sesión como {email} ({status}): {data[:200]!r}')
+    return json.loads(data)['access_token']
+
+
+def prepare(base_url, password, users=10):
+    """Inicia sesión con las cuentas del seeder y junta ids para los pasos"""
+    ctx = BenchContext(password)
+    client = _Client(base_url)
+    ctx.superadmin_token = _login(client, SUPERADMIN_EMAIL, password)
+    ctx.admin_token = _login(client, ADMIN_EMAIL, password)
+
+    # El seeder inserta primero a los admins (~2% de los usuarios), así que la
+    # primera página puede no traer ningún usuario normal: se avanza con el
+    # cursor hasta juntar una muestra suficiente o terminar la lista
+    regular = []
+    cursor = None
+    while len(regular) < USER_SAMPLE_SIZE:
+        path = '/api/users/all?limit=500' + (f'&after={cursor}' if cursor else '')
+        status, _, data = client.request('GET', path, token=ctx.superadmin_token)
+        if status != 200:
+            raise RuntimeError(f'No se pudo listar usuarios ({status}): {data[:200]!r}')
+        page = json.loads(data)
+        regular += [user for user in page['items'] if user['role_id'] == 3 and user['active']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    ctx.user_ids = [user['id'] for user in regular]
+    ctx.user_emails = [user['email'] for user in regular]
+    ctx.user_tokens = [_login(client, email, password) for email in ctx.user_emails[:users]]
+
+    _, _, data = client.request('GET', '/api/companies/all?limit=500', token=ctx.superadmin_token)
+    ctx.company_ids = [company['id'] for company in json.loads(data)['items']]
+    client.close()
+
+    if not ctx.user_tokens or not ctx.company_ids:
+        raise RuntimeError('No hay datos suficientes; ejecuta primero `flask seed`')
+    return ctx
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _summary(latencies, elapsed, statuses=None, queries=None):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': _round(percentile(latencies, 50)),
+        'p95_ms': _round(percentile(latencies, 95)),
+        'p99_ms': _round(percentile(latencies, 99)),
+        'max_ms': _round(latencies[-1] if latencies else None)
+    }
+    if statuses is not None:
+        summary['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+    if queries:
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2)
+    return summary
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def run_scenario(base_url, scenario, concurrency, duration, password, warmup=2, random_seed=1):
+    """
+    Ejecuta `scenario` con `concurrency` usuarios virtuales (hilos con su propia
+    conexión keep-alive) durante `duration` segundos, después de `warmup`
+    segundos que no se miden. Regresa un dict listo para guardarse como JSON:
+    totales y, por paso, requests/s, p50/p95/p99, códigos de respuesta y
+    consultas por request (del header Server-Timing, si la app lo envía).
+    """
+    weights = SCENARIOS[scenario]
+    names = list(weights)
+    ctx = prepare(base_url, password)
+
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    queries = defaultdict(list)
+    errors = defaultdict(int)
+
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    def virtual_user(number):
+        rng = random.Random(random_seed * 1000 + number)
+        client = _Client(base_url)
+        local = defaultdict(list)
+        local_statuses = defaultdict(lambda: defaultdict(int))
+        local_queries = defaultdict(list)
+        local_errors = defaultdict(int)
+
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            method, path, body, token = STEPS[name](ctx, rng)
+            try:
+                status, server_timing, _ = client.request(method, path, body, token)
+            except (OSError, http.client.HTTPException):
+                if now >= measure_from:
+                    local_errors[name] += 1
+                continue
+            finished = time.perf_counter()
+            if now < measure_from:
+                continue
+
+            local[name].append((finished - now) * 1000)
+            local_statuses[name][status] += 1
+            match = _QUERIES.search(server_timing or '')
+            if match:
+                local_queries[name].append(int(match.group(1)))
+
+        client.close()
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                queries[name].extend(local_queries[name])
+                errors[name] += local_errors[name]
+                for status, count in local_statuses[name].items():
+                    statuses[name][status] += count
+
+    threads = [threading.Thread(target=virtual_user, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_latencies = [value for name in names for value in latencies[name]]
+    all_statuses = defaultdict(int)
+    for name in names:
+        for status, count in statuses[name].items():
+            all_statuses[status] += count
+
+    steps = {}
+    for name in names:
+        steps[name] = _summary(latencies[name], duration, statuses[name], queries[name])
+        steps[name]['errors'] = errors[name]
+
+    total = _summary(all_latencies, duration, all_statuses,
+                     [value for name in names for value in queries[name]])
+    total['errors'] = sum(errors.values())
+    return {
+        'scenario': scenario,
+        'base_url': base_url,
+        'concurrency': concurrency,
+        'duration_s': duration,
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'total': total,
+        'steps': steps
+    }
+
+
+def compare(baseline, current, threshold=10.0, min_requests=30):
+    """
+    Compara dos resultados de run_scenario paso por paso. Regresa (filas,
+    hubo_regresión): una regresión es un p95 más de `threshold`% mayor o un
+    throughput más de `threshold`% menor que en la línea base. Los pasos con
+    menos de `min_requests` requests en alguna corrida se muestran pero no
+    cuentan, porque sus percentiles son puro ruido.
+    """
+    rows = []
+    regression = False
+    names = ['total'] + [name for name in current['steps'] if name in baseline['steps']]
+
+    for name in names:
+        before = baseline['total'] if name == 'total' else baseline['steps'][name]
+        after = current['total'] if name == 'total' else current['steps'][name]
+        row = {'step': name}
+        enough = min(before['requests'], after['requests']) >= min_requests
+        for metric, worse_if_higher in (('p95_ms', True), ('p99_ms', True), ('rps', False),
+                                        ('queries_per_request', True)):
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            row[metric] = {'before': old, 'after': new, 'change_pct': round(change, 1)}
+            if enough and metric in ('p95_ms', 'rps'):
+                if (change > threshold) if worse_if_higher else (change < -threshold):
+                    row[metric]['regression'] = True
+                    regression = True
+        rows.append(row)
+    return rows, regression
@@ -0,0 +1,141 @@
+import random
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.companies import Company
+from app.models.jobs import Job
+from app.models.roles import ROLE_SUPERADMIN, ROLE_ADMIN, ROLE_USER
+from app.models.users import User, user_companies
+from app.utils.conditional import invalidate
+from app.utils.passwords import password_hasher
+
+# Los datos sintéticos se reconocen por el dominio de los emails y el prefijo
+# de los nombres de compañía, así --reset solo borra lo que generó el seeder
+SEED_EMAIL_DOMAIN = 'bench.test'
+SEED_COMPANY_PREFIX = 'bench-'
+SUPERADMIN_EMAIL = f'superadmin@{SEED_EMAIL_DOMAIN}'
+ADMIN_EMAIL = f'admin@{SEED_EMAIL_DOMAIN}'
+INSERT_BATCH_SIZE = 5000
+
+FIRST_NAMES = ['Ana', 'Luis', 'María', 'José', 'Sofía', 'Carlos', 'Lucía', 'Miguel',
+               'Valeria', 'Jorge', 'Fernanda', 'Diego', 'Camila', 'Andrés', 'Paula']
+LAST_NAMES = ['García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez',
+              'Rodríguez', 'Sánchez', 'Ramírez', 'Torres', 'Flores', 'Rivera']
+
+users_t = User.__table__
+companies_t = Company.__table__
+
+
+def seed_email(index):
+    return f'user{index}@{SEED_EMAIL_DOMAIN}'
+
+
+def reset_seed_data():
+    """Borra usuarios y compañías generados por el seeder (y lo que los referencia)"""
+    seed_users = db.select(users_t.c.id).where(users_t.c.email.like(f'%@{SEED_EMAIL_DOMAIN}'))
+    seed_companies = db.select(companies_t.c.id).where(companies_t.c.name.like(f'{SEED_COMPANY_PREFIX}%'))
+
+    db.session.execute(user_companies.delete().where(
+        user_companies.c.user_id.in_(seed_users) | user_companies.c.company_id.in_(seed_companies)
+    ))
+    db.session.execute(db.delete(Job).where(Job.created_by.in_(seed_users)))
+    db.session.execute(users_t.update().where(users_t.c.primary_company_id.in_(seed_companies))
+                       .values(primary_company_id=None))
+    db.session.execute(companies_t.update().where(companies_t.c.user_id.in_(seed_users))
+                       .values(user_id=None))
+    db.session.execute(companies_t.delete().where(companies_t.c.id.in_(seed_companies)))
+    db.session.execute(users_t.delete().where(users_t.c.id.in_(seed_users)))
+    invalidate('users', 'companies', 'user_companies')
+    db.session.commit()
+
+
+def _insert_returning_ids(table, rows):
+    ids = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        ids.extend(db.session.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True),
+            rows[start:start + INSERT_BATCH_SIZE]
+        ).scalars())
+    return ids
+
+
+def seed(users, companies, memberships, password, admin_ratio=0.02, random_seed=42, progress=None):
+    """
+    Genera un conjunto de datos sintético y reproducible (misma semilla, mismos
+    datos): un superadmin y un admin conocidos, `companies` compañías y `users`
+    usuarios con entre 1 y 2 * `memberships` - 1 compañías cada uno (promedio
+    `memberships`). Las compañías se eligen con una distribución sesgada, así
+    unas pocas tienen muchos miembros, como en producción. Todos los usuarios
+    comparten el hash de `password` para no calcular miles de hashes.
+    """
+    rng = random.Random(random_seed)
+    hashed_password = password_hasher.hash(password)
+    now = datetime.utcnow()
+
+    def created_at():
+        return now - timedelta(days=rng.randint(0, 3 * 365), seconds=rng.randint(0, 86400))
+
+    def person(email, role_id):
+        return {
+            'email': email,
+            'password': hashed_password,
+            'name': rng.choice(FIRST_NAMES),
+            'lastname': rng.choice(LAST_NAMES),
+            'role_id': role_id,
+            'active': rng.random() > 0.03,
+            'created_at': created_at()
+        }
+
+    # Cuentas fijas que usa el runner de escenarios, más los admins de contacto
+    staff = [person(SUPERADMIN_EMAIL, ROLE_SUPERADMIN), person(ADMIN_EMAIL, ROLE_ADMIN)]
+    staff[0]['active'] = staff[1]['active'] = True
+    admin_count = max(1, int(users * admin_ratio))
+    staff += [person(seed_email(index), ROLE_ADMIN) for index in range(admin_count)]
+    staff_ids = _insert_returning_ids(users_t, staff)
+
+    company_ids = _insert_returning_ids(companies_t, [
+        {
+            'name': f'{SEED_COMPANY_PREFIX}{index:06d}',
+            'description': f'Compañía sintética {index}',
+            'user_id': rng.choice(staff_ids[1:]),
+            'created_at': created_at(),
+            'active': rng.random() > 0.05
+        }
+        for index in range(companies)
+    ])
+    if progress:
+        progress(f'{len(staff_ids)} administradores y {len(company_ids)} compañías')
+
+    # Peso 1/rango: la compañía k tiene ~1/k de los miembros de la primera
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(company_ids) + 1)))
+    # El admin fijo pertenece a las primeras compañías para poder crear usuarios en ellas
+    admin_memberships = [{'user_id': staff_ids[1], 'company_id': company_id}
+                         for company_id in company_ids[:10]]
+    db.session.execute(user_companies.insert(), admin_memberships)
+
+    created = len(staff_ids)
+    for start in range(admin_count, users, INSERT_BATCH_SIZE):
+        batch = [person(seed_email(index), ROLE_USER)
+                 for index in range(start, min(start + INSERT_BATCH_SIZE, users))]
+        picks = []
+        for row in batch:
+            count = rng.randint(1, 2 * memberships - 1)
+            chosen = list(dict.fromkeys(rng.choices(company_ids, cum_weights=cum_weights, k=count)))
+            row['primary_company_id'] = chosen[0]
+            picks.append(chosen)
+
+        user_ids = _insert_returning_ids(users_t, batch)
+        db.session.execute(user_companies.insert(), [
+            {'user_id': user_id, 'company_id': company_id}
+            for user_id, chosen in zip(user_ids, picks)
+            for company_id in chosen
+        ])
+        db.session.commit()
+        created += len(user_ids)
+        if progress:
+            progress(f'{created} usuarios')
+
+    invalidate('users', 'companies', 'user_companies')
+    db.session.commit()
+    return {'users': created, 'companies': len(company_ids)}
@@ -0,0 +1,298 @@
+import csv
+import io
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.companies import Company
+from app.models.users import User, bump_membership_claims, email_key, normalize_email, user_companies
+from app.utils.conditional import invalidate
+from app.utils.ndjson import iter_ndjson
+
+IMPORT_BATCH_SIZE = 1000
+# Máximo de errores que se guardan en el reporte (los demás solo se cuentan)
+MAX_REPORTED_ERRORS = 1000
+
+companies_t = Company.__table__
+users_t = User.__table__
+
+# Un valor más largo que la columna haría fallar todo el lote en Postgres
+NAME_LENGTH = companies_t.c.name.type.length
+DESCRIPTION_LENGTH = companies_t.c.description.type.length
+
+# Motores con INSERT ... ON CONFLICT DO NOTHING
+_CONFLICT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def iter_csv(stream):
+    """
+    (número de línea, fila) de un CSV con encabezados (stream binario), una por
+    una. Los encabezados son la línea 1.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_import_rows(stream, file_format):
+    """
+    (número de línea, fila) de un archivo CSV o NDJSON para import_companies.
+    Los errores del reporte usan ese número, el mismo que ve quien abre el
+    archivo. Una línea de NDJSON inválida llega como None y se reporta.
+    """
+    if file_format == 'csv':
+        return iter_csv(stream)
+    return iter_ndjson(stream, strict=False, numbered=True)
+
+
+def _parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'si', 'sí')
+
+
+def _parse_text(value, field):
+    """Texto sin espacios en los extremos ('' si falta); en NDJSON puede llegar otro tipo"""
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ImportRowError(f'{field} debe ser texto')
+    return value.strip()
+
+
+def _parse_int(value, field):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'{field} no es un ID válido')
+
+
+def _parse_members(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        # En CSV los IDs van separados por ';'
+        value = [part for part in value.replace(',', ';').split(';') if part.strip()]
+    if not isinstance(value, list):
+        raise ImportRowError('member_ids debe ser una lista de IDs')
+    return [_parse_int(member, 'member_ids') for member in value]
+
+
+def _normalize(raw):
+    """Convierte una fila de CSV/NDJSON en un dict con tipos; lanza ImportRowError"""
+    if not isinstance(raw, dict):
+        raise ImportRowError('La fila no es un objeto JSON válido')
+
+    name = _parse_text(raw.get('name'), 'name')
+    if not name:
+        raise ImportRowError('El nombre de la compañía es requerido')
+    if len(name) > NAME_LENGTH:
+        raise ImportRowError(f'El nombre de la compañía no puede tener más de {NAME_LENGTH} caracteres')
+
+    description = raw.get('description')
+    if not description:
+        raise ImportRowError('La descripción de la compañía es requerida')
+    if not isinstance(description, str):
+        raise ImportRowError('description debe ser texto')
+    if len(description) > DESCRIPTION_LENGTH:
+        raise ImportRowError(
+            f'La descripción de la compañía no puede tener más de {DESCRIPTION_LENGTH} caracteres')
+
+    contact_email = normalize_email(_parse_text(raw.get('contact_email'), 'contact_email')) or None
+    return {
+        'name': name,
+        'description': description,
+        'user_id': _parse_int(raw.get('user_id'), 'user_id'),
+        'contact_email': contact_email,
+        'active': _parse_bool(raw.get('active')),
+        'member_ids': _parse_members(raw.get('member_ids'))
+    }
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors
+        }
+
+
+def import_companies(rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Importa compañías desde un iterable de (número de línea, fila) con memoria
+    constante (ver iter_import_rows): se procesan en lotes de `batch_size`,
+    cada uno con un número fijo de consultas y su propio commit. Las compañías
+    se identifican por nombre (se crean o se actualizan) y las membresías
+    existentes se conservan. `progress(report)` se llama al terminar cada lote.
+    """
+    report = ImportReport()
+    batch = []
+
+    for row_number, raw in rows:
+        report.processed += 1
+        try:
+            batch.append((row_number, _normalize(raw)))
+        except ImportRowError as e:
+            report.error(row_number, str(e))
+
+        if len(batch) >= batch_size:
+            _import_batch(batch, report)
+            batch = []
+            if progress:
+                progress(report)
+
+    if batch:
+        _import_batch(batch, report)
+        if progress:
+            progress(report)
+    return report
+
+
+def _import_batch(batch, report):
+    # Nombres repetidos dentro del mismo lote
+    rows = {}
+    for row_number, row in batch:
+        if row['name'] in rows:
+            report.error(row_number, 'El nombre está repetido en el archivo')
+        else:
+            rows[row['name']] = (row_number, row)
+
+    # Usuarios de contacto y miembros: dos consultas para todo el lote
+    emails = {row['contact_email'] for _, row in rows.values() if row['contact_email']}
+    user_ids_by_email = dict(db.session.execute(
+        db.select(email_key(users_t), users_t.c.id).where(email_key(users_t).in_(emails))
+    ).tuples().all()) if emails else {}
+
+    referenced_ids = set()
+    for _, row in rows.values():
+        referenced_ids.update(row['member_ids'])
+        if row['user_id']:
+            referenced_ids.add(row['user_id'])
+    existing_user_ids = set(db.session.execute(
+        db.select(users_t.c.id).where(users_t.c.id.in_(referenced_ids))
+    ).scalars()) if referenced_ids else set()
+
+    valid = {}
+    for name, (row_number, row) in rows.items():
+        if row['contact_email']:
+            if row['contact_email'] not in user_ids_by_email:
+                report.error(row_number, 'Usuario de contacto no encontrado')
+                continue
+            row['user_id'] = user_ids_by_email[row['contact_email']]
+        elif row['user_id'] and row['user_id'] not in existing_user_ids:
+            report.error(row_number, 'Usuario de contacto no encontrado')
+            continue
+
+        missing = [member for member in row['member_ids'] if member not in existing_user_ids]
+        if missing:
+            report.error(row_number, f'Usuarios no encontrados: {missing}')
+            continue
+        valid[name] = row
+
+    if not valid:
+        return
+
+    # Compañías existentes por nombre: se actualizan, las demás se insertan
+    existing = dict(db.session.execute(
+        db.select(companies_t.c.name, companies_t.c.id).where(companies_t.c.name.in_(valid))
+    ).tuples().all())
+
+    updates = [
+        {
+            'b_id': existing[name],
+            'b_description': row['description'],
+            'b_user_id': row['user_id'],
+            'b_active': row['active']
+        }
+        for name, row in valid.items() if name in existing
+    ]
+    if updates:
+        db.session.execute(
+            companies_t.update()
+            .where(companies_t.c.id == db.bindparam('b_id'))
+            .values(
+                description=db.bindparam('b_description'),
+                user_id=db.bindparam('b_user_id'),
+                active=db.bindparam('b_active')
+            ),
+            updates
+        )
+
+    new_rows = [
+        {
+            'name': name,
+            'description': row['description'],
+            'user_id': row['user_id'],
+            'active': row['active']
+        }
+        for name, row in valid.items() if name not in existing
+    ]
+    company_ids = dict(existing)
+    inserted = {}
+    if new_rows:
+        # Con ON CONFLICT DO NOTHING, un nombre que otro request creó después
+        # de la consulta de arriba se reporta en su fila y no aborta el lote
+        insert = _CONFLICT_INSERTS.get(db.session.get_bind().dialect.name)
+        if insert is not None:
+            statement = insert(companies_t).on_conflict_do_nothing(index_elements=[companies_t.c.name])
+        else:
+            statement = companies_t.insert()
+        inserted = dict(db.session.execute(
+            statement.returning(companies_t.c.name, companies_t.c.id), new_rows
+        ).tuples().all())
+        for row in new_rows:
+            if row['name'] not in inserted:
+                report.error(rows[row['name']][0], 'Ya existe una compañía con ese nombre')
+                del valid[row['name']]
+        company_ids.update(inserted)
+
+    # Membresías: el contacto también queda asociado, como en add_company
+    wanted = set()
+    for name, row in valid.items():
+        members = set(row['member_ids'])
+        if row['user_id']:
+            members.add(row['user_id'])
+        wanted.update((member, company_ids[name]) for member in members)
+
+    if wanted:
+        pair = db.tuple_(user_companies.c.user_id, user_companies.c.company_id)
+        current = set(db.session.execute(
+            db.select(user_companies.c.user_id, user_companies.c.company_id)
+            .where(pair.in_(list(wanted)))
+        ).tuples().all())
+        missing = wanted - current
+        if missing:
+            db.session.execute(
+                user_companies.insert(),
+                [{'user_id': user_id, 'company_id': company_id} for user_id, company_id in missing]
+            )
+            bump_membership_claims({user_id for user_id, _ in missing})
+
+    invalidate('companies', 'user_companies')
+    db.session.commit()
+
+    report.created += len(inserted)
+    report.updated += len(updates)
@@ -0,0 +1,66 @@
+from app import db
+from app.models.users import User, bump_membership_claims, user_companies
+from app.utils.conditional import invalidate
+
+MOVE_BATCH_SIZE = 1000
+
+users_t = User.__table__
+
+
+def move_members(from_company_id, to_company_id, batch_size=MOVE_BATCH_SIZE, progress=None):
+    """
+    Pasa a todos los miembros de una compañía a otra, en lotes de usuarios por
+    id, cada uno con su propio commit. Quien ya era miembro de la compañía
+    destino conserva esa membresía, y la compañía principal se cambia cuando
+    era la de origen. `progress(moved, total)` se llama al terminar cada lote.
+    """
+    total = db.session.execute(
+        db.select(db.func.count()).select_from(user_companies)
+        .where(user_companies.c.company_id == from_company_id)
+    ).scalar()
+    moved = 0
+    after_id = 0
+
+    while True:
+        user_ids = db.session.execute(
+            db.select(user_companies.c.user_id)
+            .where(user_companies.c.company_id == from_company_id,
+                   user_companies.c.user_id > after_id)
+            .order_by(user_companies.c.user_id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not user_ids:
+            break
+
+        already_members = set(db.session.execute(
+            db.select(user_companies.c.user_id)
+            .where(user_companies.c.company_id == to_company_id,
+                   user_companies.c.user_id.in_(user_ids))
+        ).scalars())
+        new_members = [user_id for user_id in user_ids if user_id not in already_members]
+        if new_members:
+            db.session.execute(user_companies.insert(), [
+                {'user_id': user_id, 'company_id': to_company_id} for user_id in new_members
+            ])
+
+        db.session.execute(
+            user_companies.delete().where(
+                user_companies.c.company_id == from_company_id,
+                user_companies.c.user_id.in_(user_ids)
+            )
+        )
+        db.session.execute(
+            users_t.update()
+            .where(users_t.c.id.in_(user_ids), users_t.c.primary_company_id == from_company_id)
+            .values(primary_company_id=to_company_id)
+        )
+        bump_membership_claims(user_ids)
+        invalidate('users', 'user_companies')
+        db.session.commit()
+
+        moved += len(user_ids)
+        after_id = user_ids[-1]
+        if progress:
+            progress(moved, total)
+
+    return {'moved': moved}
@@ -0,0 +1,127 @@
+from app import db
+from app.models.roles import ROLE_SUPERADMIN, ROLE_ADMIN, ROLE_USER
+from app.models.users import User, email_key, normalize_email, user_companies
+from app.utils.company_catalog import company_catalog
+from app.utils.conditional import invalidate
+from app.utils.passwords import password_hasher
+
+BULK_MAX_ITEMS = 1000
+
+users_t = User.__table__
+
+
+def _validate(item, creator_role_id, creator_company_ids):
+    """Mismas reglas que create_user; regresa un mensaje de error o None"""
+    if not isinstance(item, dict) or not item.get('email') or not item.get('password'):
+        return 'Faltan campos requeridos (email y password)'
+
+    # Un valor de otro tipo haría fallar el lote completo al normalizar, hashear o insertar
+    if not isinstance(item['email'], str) or not item['email'].strip():
+        return 'El email no es válido'
+    if not isinstance(item['password'], str):
+        return 'La contraseña no es válida'
+    for field in ('name', 'lastname'):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            return f'{field} debe ser texto'
+
+    try:
+        role_id = int(item.get('role_id', ROLE_USER))
+    except (TypeError, ValueError):
+        return 'El rol no es válido'
+
+    # Los admin pueden crear usuarios y otros admin, pero no superadmin
+    if creator_role_id == ROLE_ADMIN and role_id == ROLE_SUPERADMIN:
+        return 'Los administradores no pueden crear superadmins'
+
+    company_ids = item.get('companies') or []
+    if not isinstance(company_ids, list) or not all(isinstance(company_id, int) for company_id in company_ids):
+        return 'companies debe ser una lista de IDs'
+
+    # Si es admin, solo puede asignar compañías a las que tiene acceso
+    if creator_role_id == ROLE_ADMIN:
+        for company_id in company_ids:
+            if company_id not in creator_company_ids:
+                return f'No tienes acceso a la compañía con ID {company_id}'
+
+    if any(company_catalog.get(company_id) is None for company_id in company_ids):
+        return 'Una o más compañías no fueron encontradas'
+
+    primary_company_id = item.get('primary_company_id')
+    if primary_company_id is not None and not isinstance(primary_company_id, int):
+        return 'La compañía principal no es válida'
+    if primary_company_id and company_ids and primary_company_id not in company_ids:
+        return 'La compañía principal debe ser una de las compañías asociadas'
+
+    return None
+
+
+def provision_users(items, creator_role_id, creator_company_ids):
+    """
+    Crea varios usuarios en una sola transacción y regresa un resultado por
+    elemento ({'index', 'status', 'id' | 'error'}), en el orden recibido.
+
+    - Las reglas de admin/superadmin se validan igual que en create_user.
+    - Los emails se normalizan y los existentes se buscan con una sola consulta (IN).
+    - Las contraseñas se hashean en paralelo en el pool de bcrypt.
+    - Usuarios y membresías se insertan con inserts de varias filas.
+    """
+    creator_company_ids = set(creator_company_ids)
+    results = [None] * len(items)
+    valid = []
+    seen_emails = set()
+
+    for index, item in enumerate(items):
+        error = _validate(item, creator_role_id, creator_company_ids)
+        if error is None:
+            # El insert es de Core, así que aquí se normaliza lo que hace User al asignar
+            item = dict(item, email=normalize_email(item['email']))
+        if error is None and item['email'] in seen_emails:
+            error = 'El email está repetido en la solicitud'
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+            continue
+        seen_emails.add(item['email'])
+        valid.append((index, item))
+
+    if seen_emails:
+        existing = set(db.session.execute(
+            db.select(email_key(users_t)).where(email_key(users_t).in_(seen_emails))
+        ).scalars())
+        for index, item in valid:
+            if item['email'] in existing:
+                results[index] = {'index': index, 'status': 'error', 'error': 'El email ya está registrado'}
+        valid = [(index, item) for index, item in valid if item['email'] not in existing]
+
+    if valid:
+        hashes = password_hasher.hash_many([item['password'] for _, item in valid])
+
+        user_ids = db.session.execute(
+            users_t.insert().returning(users_t.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    'email': item['email'],
+                    'password': hashed_password,
+                    'name': item.get('name', ''),
+                    'lastname': item.get('lastname', ''),
+                    'role_id': int(item.get('role_id', ROLE_USER)),
+                    'primary_company_id': item.get('primary_company_id')
+                }
+                for (_, item), hashed_password in zip(valid, hashes)
+            ]
+        ).scalars().all()
+
+        memberships = [
+            {'user_id': user_id, 'company_id': company_id}
+            for (_, item), user_id in zip(valid, user_ids)
+            for company_id in dict.fromkeys(item.get('companies') or [])
+        ]
+        if memberships:
+            db.session.execute(user_companies.insert(), memberships)
+
+        invalidate('users', 'user_companies')
+        db.session.commit()
+
+        for (index, _), user_id in zip(valid, user_ids):
+            results[index] = {'index': index, 'status': 'created', 'id': user_id}
+
+    return results
@@ -0,0 +1,192 @@
+import json
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.bulk.companies import IMPORT_BATCH_SIZE, import_companies, iter_import_rows
+from app.utils.passwords import calibrate, save_calibration
+
+passwords_cli = AppGroup('passwords', help='Política de hash de contraseñas.')
+companies_cli = AppGroup('companies', help='Administración de compañías.')
+bench_cli = AppGroup('bench', help='Pruebas de carga con datos sintéticos.')
+
+
+@click.command('init-db')
+def init_db_command():
+    """Crea las tablas que falten y los roles base (desarrollo; en despliegues `flask db upgrade`)."""
+    from app import init_db
+
+    init_db()
+    click.echo('Base de datos inicializada correctamente')
+
+
+@passwords_cli.command('calibrate')
+@click.option('--target-ms', type=int, default=None,
+              help='Tiempo objetivo por hash (por defecto PASSWORD_HASH_TARGET_MS).')
+@click.option('--scheme', type=click.Choice(['bcrypt', 'argon2']), default=None,
+              help='Esquema a calibrar (por defecto PASSWORD_HASH_SCHEME).')
+@click.option('--save', is_flag=True,
+              help='Guarda el costo en PASSWORD_HASH_CALIBRATION_FILE para que lo usen los workers '
+                   'con PASSWORD_HASH_AUTOCALIBRATE.')
+def calibrate_command(target_ms, scheme, save):
+    """Mide el costo de hash en esta máquina y sugiere la configuración."""
+    target_ms = target_ms or current_app.config['PASSWORD_HASH_TARGET_MS']
+    scheme = scheme or current_app.config['PASSWORD_HASH_SCHEME']
+    cost, timings = calibrate(target_ms, scheme)
+
+    for value, elapsed in timings:
+        click.echo(f'  costo {value:2d}: {elapsed:8.1f} ms')
+
+    setting = 'ARGON2_TIME_COST' if scheme == 'argon2' else 'BCRYPT_LOG_ROUNDS'
+    click.echo(f'Objetivo {target_ms} ms -> {setting}={cost}')
+    if save:
+        path = current_app.config['PASSWORD_HASH_CALIBRATION_FILE']
+        save_calibration(path, scheme, target_ms, cost)
+        click.echo(f'Guardado en {path}')
+
+
+@companies_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Formato del archivo (por defecto según la extensión).')
+@click.option('--batch-size', type=int, default=IMPORT_BATCH_SIZE, show_default=True)
+def import_companies_command(path, file_format, batch_size):
+    """Importa compañías y membresías desde un archivo CSV o NDJSON."""
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+    def progress(report):
+        click.echo(f'  {report.processed} filas: {report.created} creadas, '
+                   f'{report.updated} actualizadas, {report.failed} con error')
+
+    with open(path, 'rb') as stream:
+        report = import_companies(iter_import_rows(stream, file_format), batch_size=batch_size,
+                                  progress=progress)
+
+    for error in report.errors:
+        click.echo(f'  fila {error["row"]}: {error["error"]}', err=True)
+
+
+@click.command('worker')
+@click.option('--workers', type=int, default=None,
+              help='Hilos que ejecutan trabajos (por defecto JOB_WORKERS).')
+def worker_command(workers):
+    """Ejecuta los trabajos en segundo plano encolados en la base de datos."""
+    from app.jobs import run_worker
+
+    workers = workers or current_app.config['JOB_WORKERS']
+    click.echo(f'Worker de trabajos con {workers} hilo(s), Ctrl+C para salir')
+    run_worker(current_app._get_current_object(), workers)
+
+
+@click.command('seed')
+@click.option('--users', type=int, default=100000, show_default=True)
+@click.option('--companies', type=int, default=5000, show_default=True)
+@click.option('--memberships', type=int, default=3, show_default=True,
+              help='Promedio de compañías por usuario.')
+@click.option('--password', default='bench-password', show_default=True,
+              help='Contraseña de todas las cuentas generadas.')
+@click.option('--seed', 'random_seed', type=int, default=42, show_default=True,
+              help='Semilla; la misma semilla genera los mismos datos.')
+@click.option('--reset', is_flag=True, help='Borra antes los datos de un seed anterior.')
+def seed_command(users, companies, memberships, password, random_seed, reset):
+    """Genera usuarios, compañías y membresías sintéticos para benchmarks."""
+    from app.bench.seed import ADMIN_EMAIL, SUPERADMIN_EMAIL, reset_seed_data, seed
+
+    if reset:
+        reset_seed_data()
+
+    started_at = time.perf_counter()
+    result = seed(users, companies, memberships, password, random_seed=random_seed,
+                  progress=lambda message: click.echo(f'  {message}'))
+    click.echo(f'{result["users"]} usuarios y {result["companies"]} compañías en '
+               f'{time.perf_counter() - started_at:.1f} s')
+    click.echo(f'Cuentas: {SUPERADMIN_EMAIL} y {ADMIN_EMAIL} (contraseña: {password})')
+
+
+@bench_cli.command('run')
+@click.argument('base_url')
+@click.option('--scenario', type=click.Choice(['read', 'login', 'list', 'write', 'mixed']),
+              default='mixed', show_default=True)
+@click.option('--concurrency', type=int, default=16, show_default=True)
+@click.option('--duration', type=float, default=30, show_default=True)
+@click.option('--warmup', type=float, default=2, show_default=True)
+@click.option('--password', default='bench-password', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Archivo JSON donde guardar el resultado.')
+def bench_run_command(base_url, scenario, concurrency, duration, warmup, password, output):
+    """Corre un escenario de carga contra BASE_URL (datos de `flask seed`)."""
+    from app.bench.runner import run_scenario
+
+    try:
+        result = run_scenario(base_url, scenario, concurrency, duration, password, warmup=warmup)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    text = json.dumps(result, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    click.echo(text)
+
+
+@bench_cli.command('compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', type=float, default=10.0, show_default=True,
+              help='Porcentaje de empeoramiento de p95 o throughput que cuenta como regresión.')
+def bench_compare_command(baseline, current, threshold):
+    """Compara dos resultados de `flask bench run`; sale con 1 si hay regresión."""
+    from app.bench.runner import compare
+
+    with open(baseline) as f:
+        before = json.load(f)
+    with open(current) as f:
+        after = json.load(f)
+
+    rows, regression = compare(before, after, threshold)
+    for row in rows:
+        parts = []
+        for metric in ('p95_ms', 'p99_ms', 'rps', 'queries_per_request'):
+            if metric in row:
+                values = row[metric]
+                mark = ' REGRESIÓN' if values.get('regression') else ''
+                parts.append(f'{metric} {values["before"]} -> {values["after"]} '
+                             f'({values["change_pct"]:+.1f}%){mark}')
+        click.echo(f'{row["step"]:>14}: ' + ', '.join(parts))
+
+    if regression:
+        raise SystemExit(1)
+
+
+@click.command('advise')
+@click.option('--min-rows', type=int, default=1000, show_default=True,
+              help='Filas a partir de las cuales un recorrido completo cuenta como problema.')
+@click.option('--verbose', '-v', is_flag=True, help='Muestra el plan completo de cada consulta.')
+def advise_command(min_rows, verbose):
+    """Revisa con EXPLAIN las consultas frecuentes; sale con 1 si falta algún índice."""
+    from app.utils.index_advisor import explain_hot_queries, unindexed_foreign_keys
+
+    problems = 0
+    for plan in explain_hot_queries(min_rows):
+        status = 'OK' if plan.ok else 'SCAN'
+        click.echo(f'[{status:>4}] {plan.name}: {plan.description}')
+        for table, rows in plan.scans:
+            click.echo(f'         recorre completa la tabla {table} ({rows} filas)')
+        if verbose or not plan.ok:
+            for line in plan.plan:
+                click.echo(f'         | {line}')
+        problems += not plan.ok
+
+    missing = unindexed_foreign_keys()
+    if missing:
+        click.echo('Llaves foráneas sin índice:')
+    for table, columns, rows in missing:
+        large = rows >= min_rows
+        click.echo(f'  {table}({", ".join(columns)}): {rows} filas'
+                   + (' <- agregar índice' if large else ''))
+        problems += large
+
+    if problems:
+        raise SystemExit(1)
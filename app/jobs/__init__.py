@@ -0,0 +1,259 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.jobs import (
+    Job, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED
+)
+
+# kind -> función(ctx, payload) que regresa el resultado (JSON serializable)
+JOB_HANDLERS = {}
+# Tipos que no se pueden repetir sin efectos duplicados: un solo intento y sin reintento manual
+NON_IDEMPOTENT_JOBS = set()
+
+
+class JobCancelled(Exception):
+    """Se pidió cancelar el trabajo; el handler se detiene en el siguiente punto seguro"""
+
+
+def job_handler(kind, idempotent=True):
+    """
+    Registra la función que ejecuta los trabajos de tipo `kind`. Con
+    idempotent=False los trabajos se intentan una sola vez y no se reintentan.
+    """
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        if not idempotent:
+            NON_IDEMPOTENT_JOBS.add(kind)
+        return fn
+    return decorator
+
+
+def enqueue(kind, payload, created_by=None, max_attempts=None):
+    """
+    Guarda un trabajo en la cola y regresa el Job. La ruta solo encola y responde
+    202; lo ejecuta el pool de la app (JOB_RUNNER=thread) o `flask worker`.
+    """
+    if kind in NON_IDEMPOTENT_JOBS:
+        max_attempts = 1
+    job = Job(
+        kind=kind,
+        payload=payload,
+        created_by=created_by,
+        max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS']
+    )
+    db.session.add(job)
+    db.session.commit()
+    notify_runner()
+    return job
+
+
+def notify_runner():
+    """Despierta al pool de la app (lo arranca la primera vez) si JOB_RUNNER=thread"""
+    if current_app.config['JOB_RUNNER'] == 'thread':
+        runner.start(current_app._get_current_object())
+        runner.wake()
+
+
+class JobContext:
+    """Lo que recibe un handler para reportar avance y revisar cancelaciones"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def progress(self, done, total=None):
+        values = {'progress': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['total'] = total
+        db.session.execute(db.update(Job).where(Job.id == self.job_id).values(**values))
+        db.session.commit()
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        cancel_requested = db.session.execute(
+            db.select(Job.cancel_requested).where(Job.id == self.job_id)
+        ).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+
+
+class JobRunner:
+    """
+    Ejecuta trabajos de la tabla `jobs` con JOB_WORKERS hilos. Cada hilo reclama
+    un trabajo con un UPDATE condicional (funciona igual en Postgres y SQLite y
+    entre procesos), respetando el límite de concurrencia por tipo de
+    JOB_CONCURRENCY. Los trabajos `running` sin latido por más de
+    JOB_STALE_AFTER segundos se consideran de un worker caído y se reintentan
+    mientras les queden intentos (max_attempts); si no, se marcan como fallidos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads = []
+        self._stopping = False
+
+    def start(self, app, workers=None):
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(workers or app.config['JOB_WORKERS']):
+                thread = threading.Thread(
+                    target=self._loop, args=(app,), name=f'job-worker-{number}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _loop(self, app):
+        while not self._stopping:
+            with app.app_context():
+                try:
+                    ran = self.run_once()
+                except Exception:
+                    current_app.logger.exception('Error en el runner de trabajos')
+                    ran = False
+                finally:
+                    db.session.remove()
+            if not ran:
+                self._wake.wait(app.config['JOB_POLL_INTERVAL'])
+                self._wake.clear()
+
+    def _fail_exhausted(self, stale_before, now):
+        """Trabajos de un worker caído que ya no tienen intentos: fallan en vez de repetirse"""
+        failed = db.session.execute(
+            db.update(Job).where(
+                Job.status == JOB_RUNNING, Job.heartbeat_at < stale_before,
+                Job.attempts >= Job.max_attempts
+            ).values(
+                status=JOB_FAILED,
+                error='El worker que lo ejecutaba dejó de responder y no quedan intentos',
+                finished_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        return failed
+
+    def _lock_kind(self, kind):
+        """
+        En Postgres, con READ COMMITTED, el conteo dentro del UPDATE no ve los
+        reclamos de otra transacción sin commit: un candado de transacción por
+        tipo los serializa. En SQLite el UPDATE ya se ejecuta con la base bloqueada.
+        """
+        if db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(db.select(db.func.pg_advisory_xact_lock(db.func.hashtext(f'jobs:{kind}'))))
+
+    def _claim(self):
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=current_app.config['JOB_STALE_AFTER'])
+        limits = current_app.config['JOB_CONCURRENCY']
+
+        self._fail_exhausted(stale_before, now)
+        claimable = (
+            (Job.status == JOB_QUEUED)
+            | ((Job.status == JOB_RUNNING) & (Job.heartbeat_at < stale_before)
+               & (Job.attempts < Job.max_attempts))
+        )
+
+        candidates = db.session.execute(
+            db.select(Job.id, Job.kind).where(claimable).order_by(Job.id).limit(20)
+        ).all()
+
+        for job_id, kind in candidates:
+            conditions = [Job.id == job_id, claimable]
+            if kind in limits:
+                # El límite se revisa en el mismo UPDATE que reclama el trabajo
+                running = db.aliased(Job)
+                self._lock_kind(kind)
+                conditions.append(
+                    db.select(db.func.count()).select_from(running).where(
+                        running.kind == kind, running.status == JOB_RUNNING,
+                        running.heartbeat_at >= stale_before
+                    ).scalar_subquery() < limits[kind]
+                )
+
+            claimed = db.session.execute(
+                db.update(Job).where(*conditions).values(
+                    status=JOB_RUNNING,
+                    attempts=Job.attempts + 1,
+                    started_at=now,
+                    heartbeat_at=now
+                )
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def run_once(self):
+        """Reclama y ejecuta un trabajo; regresa False si no había ninguno"""
+        job = self._claim()
+        if job is None:
+            return False
+
+        job_id, kind, payload = job.id, job.kind, job.payload
+        handler = JOB_HANDLERS.get(kind)
+        try:
+            if handler is None:
+                raise RuntimeError(f'No hay handler para trabajos de tipo {kind}')
+            if job.cancel_requested:
+                raise JobCancelled()
+            result = handler(JobContext(job_id), payload)
+        except JobCancelled:
+            db.session.rollback()
+            self._finish(job_id, JOB_CANCELLED)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception(f'Falló el trabajo {job_id}')
+            job = db.session.get(Job, job_id)
+            retry = job.attempts < job.max_attempts and not job.cancel_requested
+            self._finish(
+                job_id, JOB_QUEUED if retry else JOB_FAILED,
+                error=str(e) or e.__class__.__name__
+            )
+        else:
+            self._finish(job_id, JOB_SUCCEEDED, result=result)
+        return True
+
+    def _finish(self, job_id, status, result=None, error=None):
+        values = {'status': status, 'heartbeat_at': datetime.utcnow()}
+        if status != JOB_QUEUED:
+            values['finished_at'] = datetime.utcnow()
+        if status == JOB_SUCCEEDED:
+            values['result'] = result
+            values['error'] = None
+        if error is not None:
+            values['error'] = error
+        db.session.execute(db.update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+
+
+runner = JobRunner()
+
+
+def run_worker(app, workers=None):
+    """Proceso dedicado (`flask worker`): ejecuta trabajos hasta recibir Ctrl+C"""
+    runner.start(app, workers)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        runner.stop()
+        runner.join()
+
+
+# Registrar los handlers de la app
+from app.jobs import handlers  # noqa: E402,F401
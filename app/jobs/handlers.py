@@ -0,0 +1,34 @@
+import io
+
+from app.bulk.companies import import_companies, iter_import_rows
+from app.bulk.memberships import move_members
+from app.bulk.users import provision_users
+from app.jobs import job_handler
+
+
+@job_handler('import_companies')
+def import_companies_job(ctx, payload):
+    # El archivo se guardó completo en el payload al encolar
+    stream = io.BytesIO(payload['content'].encode('utf-8'))
+    report = import_companies(iter_import_rows(stream, payload['format']),
+                              progress=lambda report: ctx.progress(report.processed))
+    return report.to_dict()
+
+
+# Un segundo intento marcaría como repetidos a los usuarios ya creados
+@job_handler('bulk_users', idempotent=False)
+def bulk_users_job(ctx, payload):
+    items = payload['items']
+    ctx.progress(0, len(items))
+    results = provision_users(items, payload['role_id'], payload['company_ids'])
+    created = sum(1 for result in results if result['status'] == 'created')
+    ctx.progress(len(items))
+    return {'created': created, 'failed': len(results) - created, 'results': results}
+
+
+@job_handler('move_members')
+def move_members_job(ctx, payload):
+    return move_members(
+        payload['from_company_id'], payload['to_company_id'],
+        progress=ctx.progress
+    )
@@ -0,0 +1,90 @@
+import dataclasses
+import json
+import time
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.utils.instrumentation import record_phase
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+@lru_cache(maxsize=8192)
+def _format_datetime(value, output_timezone):
+    # Las mismas fechas se repiten mucho en un listado (p. ej. la fecha de una
+    # compañía aparece en cada uno de sus usuarios), así que se guardan ya formateadas
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(output_timezone).isoformat()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de la app (lo usan jsonify y las respuestas en streaming).
+    Usa orjson si está instalado y si no, la librería estándar.
+    Las fechas se convierten a la zona horaria de JSON_OUTPUT_TIMEZONE y se
+    escriben en ISO 8601; las fechas sin zona se asumen en UTC, que es como
+    se guardan (datetime.utcnow).
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._timezone_name = None
+        self._timezone = timezone.utc
+
+    def _output_timezone(self):
+        name = self._app.config.get('JSON_OUTPUT_TIMEZONE', 'UTC')
+        if name != self._timezone_name:
+            self._timezone = timezone.utc if name == 'UTC' else ZoneInfo(name)
+            self._timezone_name = name
+        return self._timezone
+
+    def format_datetime(self, value):
+        """Fecha en ISO 8601 en la zona de salida, igual que en las respuestas JSON"""
+        return _format_datetime(value, self._output_timezone())
+
+    def _default(self, o):
+        if isinstance(o, datetime):
+            return self.format_datetime(o)
+        if isinstance(o, date):
+            return o.isoformat()
+        if dataclasses.is_dataclass(o) and not isinstance(o, type):
+            return dataclasses.asdict(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return self._dumps(obj, **kwargs)
+        finally:
+            record_phase('serialize', time.perf_counter() - started_at)
+
+    def _dumps(self, obj, **kwargs):
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if self._output_timezone() is timezone.utc:
+                # orjson ya escribe las fechas en UTC sin pasar por Python
+                option |= orjson.OPT_NAIVE_UTC
+            else:
+                option |= orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if kwargs.get('indent'):
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=self._default, option=option).decode('utf-8')
+
+        kwargs.setdefault('default', self._default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
@@ -0,0 +1,56 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+
+# Motores con INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+class CacheVersion(db.Model):
+    """
+    Contador de cambios por tabla. Cada escritura incrementa el contador en la
+    misma transacción; los workers comparan su copia con este valor para saber
+    si sus cachés siguen vigentes.
+    """
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name} {self.version}>'
+
+
+def bump_version(name):
+    """
+    Incrementa el contador `name` dentro de la transacción actual (no hace
+    commit) y regresa su nuevo valor. Con un upsert, dos transacciones que crean
+    el mismo contador a la vez no chocan con la llave primaria.
+    """
+    table = CacheVersion.__table__
+    insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        return db.session.execute(
+            insert(table).values(name=name, version=1).on_conflict_do_update(
+                index_elements=[table.c.name], set_={'version': table.c.version + 1}
+            ).returning(table.c.version)
+        ).scalar_one()
+
+    result = db.session.execute(
+        table.update().where(table.c.name == name).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(name=name, version=1))
+    return get_versions(name)[name]
+
+
+def get_versions(*names):
+    """Regresa {name: version} para los contadores pedidos (0 si no existen)"""
+    table = CacheVersion.__table__
+    rows = db.session.execute(
+        db.select(table.c.name, table.c.version).where(table.c.name.in_(names))
+    )
+    versions = dict.fromkeys(names, 0)
+    for name, version in rows:
+        versions[name] = version
+    return versions
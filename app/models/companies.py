@@ -1,4 +1,5 @@
 from app import db
+from app.models.search import search_indexes
 from datetime import datetime
 
 
@@ -20,7 +21,7 @@ class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.String(355))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     active = db.Column(db.Boolean, default=True)
     
@@ -50,4 +51,7 @@ class Company(db.Model):
         else:
             company_dict['user'] = None
         
-        return company_dict
\ No newline at end of file
+        return company_dict
+
+
+search_indexes(Company.__table__, 'name')
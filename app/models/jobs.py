@@ -0,0 +1,52 @@
+from app import db
+from datetime import datetime
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+
+class Job(db.Model):
+    """Trabajo en segundo plano (importaciones, exportaciones, cambios masivos)"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=JOB_QUEUED, index=True)
+    payload = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Se actualiza con cada avance; sirve para detectar trabajos de workers caídos
+    heartbeat_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': self.cancel_requested,
+            'result': self.result,
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
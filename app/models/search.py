@@ -0,0 +1,27 @@
+from sqlalchemy import DDL, event
+
+from app import db
+
+# Índices de la búsqueda (/api/users/search y /api/companies/search), solo en
+# Postgres: trigramas (pg_trgm) para subcadenas y text_pattern_ops para los
+# prefijos de 1 o 2 letras, que los trigramas no cubren. En los demás motores
+# la búsqueda usa el índice en memoria (app/utils/search_index.py).
+
+event.listen(
+    db.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+
+def search_indexes(table, *columns):
+    """Declara los índices de búsqueda sobre lower(columna) de `table`"""
+    for column in columns:
+        expression = db.func.lower(table.c[column])
+        db.Index(
+            f'ix_{table.name}_{column}_trgm', expression.label(f'{column}_lower'),
+            postgresql_using='gin', postgresql_ops={f'{column}_lower': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql')
+        db.Index(
+            f'ix_{table.name}_{column}_prefix', expression.label(f'{column}_lower'),
+            postgresql_ops={f'{column}_lower': 'text_pattern_ops'}
+        ).ddl_if(dialect='postgresql')
@@ -1,22 +1,37 @@
 from app import db
+from app.models.cache_versions import bump_version
+from app.models.companies import Company
+from app.models.roles import ROLE_ADMIN
+from app.models.search import search_indexes
 from datetime import datetime
+from sqlalchemy.orm import validates
 
 user_companies = db.Table('user_companies',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('company_id', db.Integer, db.ForeignKey('companies.id'), primary_key=True)
+    db.Column('company_id', db.Integer, db.ForeignKey('companies.id'), primary_key=True),
+    # La llave primaria (user_id, company_id) no sirve para buscar los miembros de una compañía
+    db.Index('ix_user_companies_company_id_user_id', 'company_id', 'user_id')
 )
 
+# Contador de cache_versions que cambia con cada bump_claims_version
+CLAIMS_VERSION_NAME = 'claims'
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    # Se guarda normalizado (normalize_email); la unicidad la da ix_users_email_lower
+    email = db.Column(db.String(120), nullable=False)
     password = db.Column(db.String(128), nullable=False)
     name = db.Column(db.String(120))
     lastname = db.Column(db.String(120))
-    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=False)
+    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), nullable=False, index=True)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    primary_company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=True)
+    primary_company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=True, index=True)
+    # Versión de los permisos (rol, activo, compañías) guardada en el JWT; al
+    # cambiar, bump_claims_version le asigna el siguiente valor del contador
+    # `claims` de cache_versions y los tokens anteriores dejan de valer
+    claims_version = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
     
     primary_company = db.relationship('Company', foreign_keys=[primary_company_id])
     companies = db.relationship('Company', secondary=user_companies, 
@@ -25,6 +40,20 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.email} {self.name}>'
 
+    @validates('email')
+    def _normalize_email(self, key, email):
+        return normalize_email(email) if email else email
+
+    @staticmethod
+    def find_by_email(email):
+        """
+        Busca al usuario sin distinguir mayúsculas (usa ix_users_email_lower).
+        Un email que no es texto (p. ej. un número en el JSON) no encuentra a nadie.
+        """
+        if not isinstance(email, str):
+            return None
+        return User.query.filter(email_key(User.__table__) == normalize_email(email)).first()
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -39,3 +68,67 @@ class User(db.Model):
             'primary_company': self.primary_company.to_dict() if self.primary_company else None,
             'companies': [company.to_dict() for company in self.companies] if self.companies else []
         }
+
+
+def normalize_email(email):
+    """Forma en la que se guardan y se buscan los emails: sin espacios y en minúsculas"""
+    return email.strip().lower()
+
+
+def email_key(users_table):
+    """Expresión lower(email) del índice único; las búsquedas deben compararla con normalize_email()"""
+    return db.func.lower(users_table.c.email)
+
+
+def bump_claims_version(user_ids):
+    """
+    Invalida los tokens de `user_ids` dentro de la transacción actual. Todos
+    reciben el nuevo valor del contador `claims` (creciente y serializado por
+    el lock de su fila), así los workers solo leen los usuarios con
+    claims_version mayor al último contador que vieron (ver claims_cache).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    version = bump_version(CLAIMS_VERSION_NAME)
+    users_table = User.__table__
+    db.session.execute(
+        users_table.update()
+        .where(users_table.c.id.in_(user_ids))
+        .values(claims_version=version)
+    )
+
+
+def bump_membership_claims(user_ids):
+    """
+    Invalida los tokens de `user_ids` después de cambiar sus compañías. Solo
+    los admins autorizan con el claim company_ids (los superadmins ven todo y
+    los usuarios normales se filtran con sus membresías en la base), así que a
+    los demás no se les cierra la sesión.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    users_table = User.__table__
+    bump_claims_version(db.session.execute(
+        db.select(users_table.c.id)
+        .where(users_table.c.id.in_(user_ids), users_table.c.role_id == ROLE_ADMIN)
+    ).scalars().all())
+
+
+db.Index('ix_users_email_lower', email_key(User.__table__), unique=True)
+search_indexes(User.__table__, 'name', 'lastname', 'email')
+
+
+def user_loader_options():
+    """
+    Opciones de carga para serializar con User.to_dict() sin consultas N+1.
+    Rol, compañía principal, compañías y sus creadores se cargan en lote
+    (SELECT ... WHERE id IN (...)), con un número fijo de consultas sin importar
+    cuántos usuarios se regresen.
+    """
+    return (
+        db.selectinload(User.role_obj),
+        db.selectinload(User.primary_company).selectinload(Company.contact_user),
+        db.selectinload(User.companies).selectinload(Company.contact_user)
+    )
@@ -0,0 +1,117 @@
+from app import db
+from app.models.users import User, user_companies
+from app.models.companies import Company
+from app.utils.streaming import STREAM_BATCH_SIZE
+
+# Listado de compañías de solo lectura con SQLAlchemy Core: una sola consulta
+# con el resumen del usuario creador en la misma fila.
+
+companies_t = Company.__table__
+creator_t = User.__table__.alias('creator')
+
+_companies_select = db.select(
+    companies_t.c.id, companies_t.c.name, companies_t.c.description,
+    companies_t.c.created_at, companies_t.c.active,
+    creator_t.c.id, creator_t.c.name, creator_t.c.lastname, creator_t.c.email
+).select_from(
+    companies_t.outerjoin(creator_t, creator_t.c.id == companies_t.c.user_id)
+).order_by(companies_t.c.id)
+
+
+def companies_page_select(visible_to=None, after_id=None, limit=None):
+    """Consulta de una página de compañías visibles para `visible_to` (None = todas)"""
+    stmt = _companies_select
+    if visible_to is not None:
+        stmt = stmt.join(
+            user_companies, user_companies.c.company_id == companies_t.c.id
+        ).where(user_companies.c.user_id == visible_to)
+    if after_id is not None:
+        stmt = stmt.where(companies_t.c.id > after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def fetch_companies(visible_to=None, after_id=None, limit=None):
+    """
+    Regresa las compañías ordenadas por id como dicts con el resumen del creador.
+    Si se pasa `visible_to` (id de usuario) solo se regresan sus compañías asociadas.
+    """
+    stmt = companies_page_select(visible_to, after_id, limit)
+
+    return [
+        {
+            'id': company_id,
+            'name': name,
+            'description': description,
+            'user': {
+                'id': creator_id,
+                'name': f"{creator_name} {creator_lastname}".strip(),
+                'email': creator_email
+            } if creator_id is not None else None,
+            'created_at': created_at,
+            'active': active
+        }
+        for (company_id, name, description, created_at, active,
+             creator_id, creator_name, creator_lastname, creator_email) in db.session.execute(stmt)
+    ]
+
+
+def iter_companies(visible_to=None, batch_size=500):
+    """Recorre las compañías visibles en lotes por llave (id), con memoria constante"""
+    after_id = None
+    while True:
+        companies = fetch_companies(visible_to, after_id, batch_size)
+        yield from companies
+        if len(companies) < batch_size:
+            return
+        after_id = companies[-1]['id']
+
+
+# Exportación: una fila plana por compañía con el creador y el número de
+# miembros, leída con un cursor del servidor. Las columnas coinciden con las
+# que acepta la importación (contact_email es el email del creador).
+COMPANY_EXPORT_COLUMNS = [
+    'id', 'name', 'description', 'user_id', 'creator_name', 'contact_email',
+    'member_count', 'created_at', 'active'
+]
+
+_member_counts = db.select(
+    user_companies.c.company_id, db.func.count().label('member_count')
+).group_by(user_companies.c.company_id).subquery('member_counts')
+
+
+def iter_companies_export(visible_to=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Recorre las compañías visibles para exportar, con memoria constante. Si se
+    pasa `visible_to` (id de usuario) solo se incluyen sus compañías asociadas.
+    """
+    stmt = db.select(
+        companies_t.c.id, companies_t.c.name, companies_t.c.description,
+        companies_t.c.user_id, creator_t.c.name, creator_t.c.lastname, creator_t.c.email,
+        db.func.coalesce(_member_counts.c.member_count, 0),
+        companies_t.c.created_at, companies_t.c.active
+    ).select_from(
+        companies_t
+        .outerjoin(creator_t, creator_t.c.id == companies_t.c.user_id)
+        .outerjoin(_member_counts, _member_counts.c.company_id == companies_t.c.id)
+    ).order_by(companies_t.c.id)
+    if visible_to is not None:
+        stmt = stmt.join(
+            user_companies, user_companies.c.company_id == companies_t.c.id
+        ).where(user_companies.c.user_id == visible_to)
+
+    result = db.session.execute(stmt, execution_options={'yield_per': batch_size})
+    for (company_id, name, description, user_id, creator_name, creator_lastname,
+         creator_email, member_count, created_at, active) in result:
+        yield {
+            'id': company_id,
+            'name': name,
+            'description': description,
+            'user_id': user_id,
+            'creator_name': f"{creator_name or ''} {creator_lastname or ''}".strip() or None,
+            'contact_email': creator_email,
+            'member_count': member_count,
+            'created_at': created_at,
+            'active': active
+        }
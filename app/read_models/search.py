@@ -0,0 +1,201 @@
+from collections import defaultdict
+
+from flask import current_app
+
+from app import db
+from app.models.companies import Company
+from app.models.users import User, user_companies
+from app.utils.search_index import (
+    RANK_EXACT, RANK_PREFIX, RANK_SUBSTRING, RANK_WORD_PREFIX, SUBSTRING_MIN_LENGTH, SearchIndex
+)
+
+# Búsqueda para autocompletar: coincidencias por prefijo y subcadena, sin
+# distinguir mayúsculas, ordenadas por rango (igual, prefijo, prefijo de
+# palabra, subcadena) y luego por nombre. En Postgres se resuelve en SQL con los
+# índices de app/models/search.py; en otros motores con el índice en memoria.
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_QUERY_LENGTH = 100
+
+
+class SearchParamsError(ValueError):
+    """Parámetros de búsqueda inválidos (q o limit)"""
+
+
+def get_search_params(args):
+    """Lee `q` y `limit` de los query params y regresa (query, limit)"""
+    query = (args.get('q') or '').strip().lower()
+    if not query:
+        raise SearchParamsError('El parámetro q es requerido')
+    if len(query) > MAX_QUERY_LENGTH:
+        raise SearchParamsError(f'El parámetro q no puede tener más de {MAX_QUERY_LENGTH} caracteres')
+
+    raw_limit = args.get('limit')
+    if raw_limit is None:
+        return query, DEFAULT_LIMIT
+    try:
+        limit = int(raw_limit)
+    except ValueError:
+        raise SearchParamsError('El parámetro limit debe ser un número entero')
+    if limit < 1 or limit > MAX_LIMIT:
+        raise SearchParamsError(f'El parámetro limit debe estar entre 1 y {MAX_LIMIT}')
+    return query, limit
+
+
+users_t = User.__table__
+companies_t = Company.__table__
+
+USER_SEARCH_FIELDS = ('name', 'lastname', 'email')
+COMPANY_SEARCH_FIELDS = ('name',)
+
+
+def _user_doc(user_id, name, lastname, email, role_id, active):
+    return {
+        'id': user_id,
+        'name': name,
+        'lastname': lastname,
+        'email': email,
+        'role_id': role_id,
+        'active': active
+    }
+
+
+def _company_doc(company_id, name, description, active):
+    return {
+        'id': company_id,
+        'name': name,
+        'description': description,
+        'active': active
+    }
+
+
+_users_columns = (users_t.c.id, users_t.c.name, users_t.c.lastname, users_t.c.email,
+                  users_t.c.role_id, users_t.c.active)
+_companies_columns = (companies_t.c.id, companies_t.c.name, companies_t.c.description,
+                      companies_t.c.active)
+
+
+def _use_database():
+    backend = current_app.config.get('SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        return db.engine.dialect.name == 'postgresql'
+    return backend == 'database'
+
+
+# --- SQL (Postgres) ---
+
+def _escape_like(query):
+    return query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_select(columns, table, fields, query):
+    """
+    Consulta de búsqueda sobre lower(campo). Las condiciones repiten las
+    expresiones de los índices para que Postgres combine los índices de cada
+    campo (BitmapOr): text_pattern_ops para prefijos y trigramas para subcadenas.
+    """
+    expressions = [db.func.lower(table.c[field]) for field in fields]
+    escaped = _escape_like(query)
+
+    def any_like(pattern):
+        return db.or_(*(expression.like(pattern, escape='\\') for expression in expressions))
+
+    match = any_like(f'%{escaped}%') if len(query) >= SUBSTRING_MIN_LENGTH else any_like(f'{escaped}%')
+    rank = db.case(
+        (db.or_(*(expression == query for expression in expressions)), RANK_EXACT),
+        (any_like(f'{escaped}%'), RANK_PREFIX),
+        (any_like(f'% {escaped}%'), RANK_WORD_PREFIX),
+        else_=RANK_SUBSTRING
+    )
+    return db.select(*columns).where(match).order_by(rank)
+
+
+def _visible_company_ids(user_id):
+    return db.select(user_companies.c.company_id).where(user_companies.c.user_id == user_id)
+
+
+def _search_users_database(query, limit, visible_to):
+    stmt = _search_select(_users_columns, users_t, USER_SEARCH_FIELDS, query)
+    if visible_to is not None:
+        members = user_companies.alias('members')
+        stmt = stmt.where(users_t.c.id.in_(
+            db.select(members.c.user_id).where(members.c.company_id.in_(_visible_company_ids(visible_to)))
+        ))
+    stmt = stmt.order_by(
+        db.func.lower(users_t.c.name), db.func.lower(users_t.c.lastname), users_t.c.id
+    ).limit(limit)
+    return [_user_doc(*row) for row in db.session.execute(stmt)]
+
+
+def _search_companies_database(query, limit, visible_to):
+    stmt = _search_select(_companies_columns, companies_t, COMPANY_SEARCH_FIELDS, query)
+    if visible_to is not None:
+        stmt = stmt.where(companies_t.c.id.in_(_visible_company_ids(visible_to)))
+    stmt = stmt.order_by(db.func.lower(companies_t.c.name), companies_t.c.id).limit(limit)
+    return [_company_doc(*row) for row in db.session.execute(stmt)]
+
+
+# --- Índice en memoria (otros motores) ---
+
+def _load_users():
+    memberships = defaultdict(list)
+    for user_id, company_id in db.session.execute(
+        db.select(user_companies.c.user_id, user_companies.c.company_id)
+    ):
+        memberships[user_id].append(company_id)
+
+    return [
+        (_user_doc(*row), (row.name, row.lastname, row.email), memberships[row.id])
+        for row in db.session.execute(db.select(*_users_columns).order_by(users_t.c.id))
+    ]
+
+
+def _load_companies():
+    return [
+        (_company_doc(*row), (row.name,), (row.id,))
+        for row in db.session.execute(db.select(*_companies_columns).order_by(companies_t.c.id))
+    ]
+
+
+# Mismo orden que el ORDER BY de la consulta SQL dentro de cada rango
+def _user_sort_key(doc):
+    return ((doc['name'] or '').lower(), (doc['lastname'] or '').lower(), doc['id'])
+
+
+def _company_sort_key(doc):
+    return (doc['name'].lower(), doc['id'])
+
+
+# Los grupos de un usuario son sus compañías; los de una compañía, ella misma
+user_search_index = SearchIndex(('users', 'user_companies'), _load_users, _user_sort_key)
+company_search_index = SearchIndex(('companies',), _load_companies, _company_sort_key)
+
+
+def _visible_groups(visible_to):
+    # Las compañías del usuario se leen de la base (llave primaria), no del índice
+    if visible_to is None:
+        return None
+    return frozenset(db.session.execute(_visible_company_ids(visible_to)).scalars())
+
+
+# --- API ---
+
+def search_users(query, limit=DEFAULT_LIMIT, visible_to=None):
+    """
+    Usuarios cuyo nombre, apellido o email contiene `query`. Si se pasa
+    `visible_to` (id de usuario) solo los que comparten alguna compañía con él.
+    """
+    if _use_database():
+        return _search_users_database(query, limit, visible_to)
+    return user_search_index.search(query, limit, _visible_groups(visible_to))
+
+
+def search_companies(query, limit=DEFAULT_LIMIT, visible_to=None):
+    """
+    Compañías cuyo nombre contiene `query`. Si se pasa `visible_to` (id de
+    usuario) solo sus compañías asociadas, como en /api/companies/all.
+    """
+    if _use_database():
+        return _search_companies_database(query, limit, visible_to)
+    return company_search_index.search(query, limit, _visible_groups(visible_to))
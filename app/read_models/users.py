@@ -0,0 +1,180 @@
+from itertools import groupby
+
+from app import db
+from app.models.users import User, user_companies
+from app.models.companies import Company
+from app.models.roles import Role
+from app.utils.streaming import STREAM_BATCH_SIZE
+
+# Listados de solo lectura construidos con SQLAlchemy Core: se seleccionan
+# columnas explícitas y cada fila se convierte directo a dict, sin hidratar
+# objetos del ORM. El resultado tiene la misma forma que User.to_dict().
+
+users_t = User.__table__
+roles_t = Role.__table__
+companies_t = Company.__table__
+primary_t = companies_t.alias('primary_company')
+primary_creator_t = users_t.alias('primary_creator')
+creator_t = users_t.alias('creator')
+
+_users_select = db.select(
+    users_t.c.id, users_t.c.email, users_t.c.name, users_t.c.lastname,
+    users_t.c.role_id, users_t.c.created_at, users_t.c.active,
+    users_t.c.primary_company_id,
+    roles_t.c.id, roles_t.c.name,
+    primary_t.c.name, primary_t.c.description, primary_t.c.user_id,
+    primary_t.c.created_at, primary_t.c.active,
+    primary_creator_t.c.id, primary_creator_t.c.name, primary_creator_t.c.email
+).select_from(
+    users_t
+    .outerjoin(roles_t, roles_t.c.id == users_t.c.role_id)
+    .outerjoin(primary_t, primary_t.c.id == users_t.c.primary_company_id)
+    .outerjoin(primary_creator_t, primary_creator_t.c.id == primary_t.c.user_id)
+).order_by(users_t.c.id)
+
+_memberships_select = db.select(
+    user_companies.c.user_id,
+    companies_t.c.id, companies_t.c.name, companies_t.c.description,
+    companies_t.c.user_id, companies_t.c.created_at, companies_t.c.active,
+    creator_t.c.id, creator_t.c.name, creator_t.c.email
+).select_from(
+    user_companies
+    .join(companies_t, companies_t.c.id == user_companies.c.company_id)
+    .outerjoin(creator_t, creator_t.c.id == companies_t.c.user_id)
+).order_by(user_companies.c.user_id, companies_t.c.id)
+
+
+def company_dict(company_id, name, description, user_id, created_at, active,
+                 creator_id, creator_name, creator_email):
+    """Misma forma que Company.to_dict() a partir de columnas sueltas"""
+    return {
+        'id': company_id,
+        'name': name,
+        'description': description,
+        'user_id': user_id,
+        'created_at': created_at,
+        'active': active,
+        'user': {
+            'id': creator_id,
+            'name': creator_name,
+            'email': creator_email
+        } if user_id and creator_id is not None else None
+    }
+
+
+def users_page_select(after_id=None, limit=None):
+    """Consulta de una página de usuarios (con rol y compañía principal)"""
+    stmt = _users_select
+    if after_id is not None:
+        stmt = stmt.where(users_t.c.id > after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def memberships_select(user_ids):
+    """Consulta de las compañías de los usuarios `user_ids`"""
+    return _memberships_select.where(user_companies.c.user_id.in_(list(user_ids)))
+
+
+def fetch_users(after_id=None, limit=None):
+    """
+    Regresa los usuarios ordenados por id como dicts con rol, compañía principal
+    y compañías. Se hacen dos consultas por lote: una para los usuarios (con rol y
+    compañía principal en la misma fila) y otra para las membresías de esos ids.
+    """
+    stmt = users_page_select(after_id, limit)
+
+    users = []
+    by_id = {}
+    for (user_id, email, name, lastname, role_id, created_at, active,
+         primary_company_id, role_row_id, role_name,
+         pc_name, pc_description, pc_user_id, pc_created_at, pc_active,
+         pc_creator_id, pc_creator_name, pc_creator_email) in db.session.execute(stmt):
+        user = {
+            'id': user_id,
+            'email': email,
+            'name': name,
+            'lastname': lastname,
+            'role_id': role_id,
+            'role': {'id': role_row_id, 'name': role_name} if role_row_id is not None else None,
+            'created_at': created_at,
+            'active': active,
+            'primary_company_id': primary_company_id,
+            'primary_company': company_dict(
+                primary_company_id, pc_name, pc_description, pc_user_id, pc_created_at,
+                pc_active, pc_creator_id, pc_creator_name, pc_creator_email
+            ) if pc_name is not None else None,
+            'companies': []
+        }
+        users.append(user)
+        by_id[user_id] = user
+
+    if by_id:
+        memberships = db.session.execute(memberships_select(by_id))
+        for user_id, *company in memberships:
+            by_id[user_id]['companies'].append(company_dict(*company))
+
+    return users
+
+
+def iter_users(batch_size=500):
+    """Recorre todos los usuarios en lotes por llave (id), con memoria constante"""
+    after_id = None
+    while True:
+        users = fetch_users(after_id, batch_size)
+        yield from users
+        if len(users) < batch_size:
+            return
+        after_id = users[-1]['id']
+
+
+# Exportación: una fila plana por usuario, leída con un cursor del servidor.
+# Las membresías vienen en la misma consulta (una fila por compañía) y se
+# agrupan al vuelo, así que solo hay un usuario en memoria a la vez.
+USER_EXPORT_COLUMNS = [
+    'id', 'email', 'name', 'lastname', 'role_id', 'role', 'primary_company_id',
+    'primary_company', 'company_ids', 'companies', 'created_at', 'active'
+]
+
+member_company_t = companies_t.alias('member_company')
+
+_users_export_select = db.select(
+    users_t.c.id, users_t.c.email, users_t.c.name, users_t.c.lastname,
+    users_t.c.role_id, roles_t.c.name, users_t.c.primary_company_id, primary_t.c.name,
+    users_t.c.created_at, users_t.c.active,
+    member_company_t.c.id, member_company_t.c.name
+).select_from(
+    users_t
+    .outerjoin(roles_t, roles_t.c.id == users_t.c.role_id)
+    .outerjoin(primary_t, primary_t.c.id == users_t.c.primary_company_id)
+    .outerjoin(user_companies, user_companies.c.user_id == users_t.c.id)
+    .outerjoin(member_company_t, member_company_t.c.id == user_companies.c.company_id)
+).order_by(users_t.c.id, member_company_t.c.id)
+
+
+def iter_users_export(batch_size=STREAM_BATCH_SIZE):
+    """Recorre todos los usuarios para exportar, con memoria constante"""
+    result = db.session.execute(
+        _users_export_select, execution_options={'yield_per': batch_size}
+    )
+    for _, rows in groupby(result, key=lambda row: row[0]):
+        rows = list(rows)
+        (user_id, email, name, lastname, role_id, role_name, primary_company_id,
+         primary_company_name, created_at, active, _, _) = rows[0]
+        companies = [(company_id, company_name) for *_, company_id, company_name in rows
+                     if company_id is not None]
+        yield {
+            'id': user_id,
+            'email': email,
+            'name': name,
+            'lastname': lastname,
+            'role_id': role_id,
+            'role': role_name,
+            'primary_company_id': primary_company_id,
+            'primary_company': primary_company_name,
+            'company_ids': [company_id for company_id, _ in companies],
+            'companies': [company_name for _, company_name in companies],
+            'created_at': created_at,
+            'active': active
+        }
@@ -0,0 +1,14 @@
+from flask import jsonify, Blueprint
+from app import db
+from app.models.roles import ROLE_SUPERADMIN
+from app.utils.db_pool import pool_telemetry
+from app.utils.permissions import require_role
+
+admin_bp = Blueprint('admin', __name__)
+
+
+# Estado del pool de conexiones de este proceso (cada worker tiene el suyo)
+@admin_bp.route('/db-pool', methods=['GET'])
+@require_role(ROLE_SUPERADMIN, message='No tienes permisos para ver la telemetría del servidor')
+def get_db_pool():
+    return jsonify(pool_telemetry.stats(db.engine)), 200
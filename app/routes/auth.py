@@ -1,13 +1,18 @@
 from flask import request, jsonify, Blueprint
 from flask_jwt_extended import create_access_token
-from app import bcrypt, db
+from app import db
 from app.models.users import User
 from app.models.roles import ROLE_USER
+from app.utils.conditional import invalidate
+from app.utils.passwords import HashPoolSaturated, password_hasher
+from app.utils.permissions import claims_for
+from app.utils.rate_limit import rate_limit
 
 auth_bp = Blueprint('auth', __name__)
 
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit('register', per_ip='5/minute')
 def register():
     data = request.get_json()
 
@@ -25,13 +30,17 @@ def register():
             'missing_fields': missing_fields
         }), 400
 
+    if not isinstance(data['email'], str):
+        return jsonify({'message': 'El correo electrónico no es válido'}), 400
+    if not isinstance(data['password'], str):
+        return jsonify({'message': 'La contraseña no es válida'}), 400
+
     # Verificar si el correo ya está registrado
-    if User.query.filter_by(email=data['email']).first():
+    if User.find_by_email(data['email']):
         return jsonify({'message': 'El correo electrónico ya está registrado'}), 409
 
     # Crear nuevo usuario
-    hashed_password = bcrypt.generate_password_hash(
-        data['password']).decode('utf-8')
+    hashed_password = password_hasher.hash(data['password'])
     new_user = User(
         name=data['name'],
         lastname=data['lastname'],
@@ -42,6 +51,7 @@ def register():
 
     # Guardar en la base de datos
     db.session.add(new_user)
+    invalidate('users')
     db.session.commit()
 
     return jsonify({'message': 'Usuario registrado exitosamente', 'user_id': new_user.id}), 201
@@ -49,6 +59,7 @@ def register():
 
 # Login de usuario
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login', per_ip='20/minute', per_email='5/minute')
 def login():
     data = request.get_json()
 
@@ -56,18 +67,29 @@ def login():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'message': 'Missing email or password'}), 400
 
-    # Buscar usuario
-    user = User.query.filter_by(email=data['email']).first()
-
-    print('login')
-    print(data)
+    # Un email o contraseña que no es texto no puede coincidir con ninguna cuenta
+    if not isinstance(data['email'], str) or not isinstance(data['password'], str):
+        return jsonify({'message': 'Invalid credentials'}), 401
 
-    print(user)
+    # Buscar usuario
+    user = User.find_by_email(data['email'])
 
     # Verificar credenciales
-    if user and bcrypt.check_password_hash(user.password, data['password']):
-        # Generar token JWT
-        access_token = create_access_token(identity=str(user.id))
+    if user and password_hasher.check(user.password, data['password']):
+        # Si el hash se generó con otro esquema o costo, se regenera con la política actual.
+        # Es opcional: con el pool de hashing lleno se deja para otro inicio de sesión
+        if password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password_hasher.hash(data['password'])
+                db.session.commit()
+            except HashPoolSaturated:
+                pass
+
+        # Generar token JWT con rol, estado y compañías para autorizar sin consultar la BD
+        access_token = create_access_token(
+            identity=str(user.id),
+            additional_claims=claims_for(user)
+        )
         return jsonify({'access_token': access_token}), 200
 
     return jsonify({'message': 'Invalid credentials'}), 401
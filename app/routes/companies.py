@@ -1,76 +1,88 @@
-from flask import jsonify, request, Blueprint
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import jsonify, request, Blueprint, current_app
+from sqlalchemy.exc import IntegrityError
 from app import db, bcrypt
 from app.models.companies import Company
-from app.models.users import User
-from app.models.roles import Role, ROLE_SUPERADMIN
-import pytz
-
-mexico_timezone = pytz.timezone('America/Mexico_City')
+from app.models.users import User, bump_membership_claims
+from app.models.roles import ROLE_SUPERADMIN
+from app.bulk.companies import import_companies, iter_import_rows
+from app.jobs import enqueue
+from app.read_models.companies import (
+    COMPANY_EXPORT_COLUMNS, fetch_companies, iter_companies, iter_companies_export
+)
+from app.read_models.search import SearchParamsError, get_search_params, search_companies
+from app.routes.jobs import async_requested, job_accepted
+from app.utils.coalesce import coalesce
+from app.utils.company_catalog import company_catalog
+from app.utils.conditional import conditional_get, invalidate
+from app.utils.instrumentation import query_budget
+from app.utils.permissions import current_claims, require_role
+from app.utils.ndjson import NDJSON_MIMETYPES
+from app.utils.pagination import PaginationError, get_page_params, split_page, page_response
+from app.utils.streaming import stream_csv, stream_json_array, stream_ndjson
 
 companies_bp = Blueprint('companies', __name__)
 
 # Obtener todos las compañias (para administradores)
 @companies_bp.route('/all', methods=['GET'])
-@jwt_required()
+# El listado es una consulta Core con el creador incluido; más consultas serían un N+1
+@query_budget(8)
+@require_role()
+@conditional_get('companies', 'users', 'user_companies')
+@coalesce(scope=lambda: _visible_to(current_claims()), buffer_streamed=True)
 def get_all_companies():
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    # Verificar que el usuario exista
-    if not current_user:
-        return jsonify({'message': 'Usuario no encontrado'}), 404
+    claims = current_claims()
     
-    # Determinar qué compañías mostrar según el rol
-    if current_user.role_id == ROLE_SUPERADMIN:
-        # Los superadmins ven todas las compañías
-        companies = Company.query.order_by(Company.id).all()
-    else:
-        # Los usuarios normales y admins solo ven sus compañías asociadas
-        companies = current_user.companies.order_by(Company.id).all()
+    try:
+        page = get_page_params(request.args)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     
-    company_list = []
-    for company in companies:
-        mexico_time = company.created_at.astimezone(mexico_timezone)
-        # Obtener información del usuario creador (si existe)
-        user_info = None
-        if company.user_id:
-            creator = User.query.get(company.user_id)
-            if creator:
-                user_info = {
-                    'id': creator.id,
-                    'name': f"{creator.name} {creator.lastname}".strip(),
-                    'email': creator.email
-                }
-        
-        company_list.append({
-            'id': company.id,
-            'name': company.name,
-            'description': company.description,
-            'user': user_info,
-            'created_at': mexico_time.isoformat(), # company.created_at,
-            'active': company.active
-        })
+    visible_to = _visible_to(claims)
 
-    return jsonify(company_list), 200
+    # El listado se arma con una consulta Core de solo lectura que ya trae al creador
+    if page is None:
+        if current_app.config['STREAM_LIST_RESPONSES']:
+            # Se codifica compañía por compañía, leyendo la tabla en lotes por id
+            return stream_json_array(iter_companies(visible_to)), 200
+        return jsonify(fetch_companies(visible_to)), 200
 
-@companies_bp.route('', methods=['POST'])
-@jwt_required()
-def add_company():
-    current_user_id = get_jwt_identity()
+    limit, after_id = page
+    companies, next_cursor = split_page(fetch_companies(visible_to, after_id, limit + 1), limit)
+    return jsonify(page_response(companies, next_cursor, limit)), 200
 
-    # Verificar que el usuario exista y sea superadmin
-    current_user = User.query.get(current_user_id)
-    if not current_user:
-        return jsonify({'message': 'Usuario no encontrado'}), 404
+# Exportar compañías (CSV o NDJSON, en streaming) con la misma visibilidad que /all
+@companies_bp.route('/export', methods=['GET'])
+@require_role()
+def export_companies():
+    visible_to = _visible_to(current_claims())
+    file_format = request.args.get('format', 'csv')
     
+    if file_format == 'csv':
+        return stream_csv(iter_companies_export(visible_to), COMPANY_EXPORT_COLUMNS, 'companies.csv'), 200
+    if file_format == 'ndjson':
+        return stream_ndjson(iter_companies_export(visible_to), 'companies.ndjson'), 200
+    return jsonify({'message': 'El formato debe ser csv o ndjson'}), 400
 
-    # {"name":"powerman","description":"powerman","active":false}
+# Buscar compañías por nombre para autocompletar (?q=texto&limit=10)
+@companies_bp.route('/search', methods=['GET'])
+@require_role()
+def search_companies_route():
+    try:
+        query, limit = get_search_params(request.args)
+    except SearchParamsError as e:
+        return jsonify({'message': str(e)}), 400
     
-    # Obtener el rol del usuario
-    role = Role.query.get(current_user.role_id)
-    if not role or role.id != ROLE_SUPERADMIN:
-        return jsonify({'message': 'No tienes permisos para crear compañías. Solo los superadministradores pueden realizar esta acción.'}), 403
+    return jsonify(search_companies(query, limit, _visible_to(current_claims()))), 200
+
+def _visible_to(claims):
+    # Determinar qué compañías mostrar según el rol: los superadmins ven todas (None),
+    # los usuarios normales y admins solo sus compañías asociadas
+    return None if claims.has_role(ROLE_SUPERADMIN) else claims.id
+
+@companies_bp.route('', methods=['POST'])
+@require_role(ROLE_SUPERADMIN, message='No tienes permisos para crear compañías. Solo los superadministradores pueden realizar esta acción.')
+def add_company():
+    # {"name":"powerman","description":"powerman","active":false}
     
     # Obtener datos del JSON
     data = request.get_json()
@@ -86,8 +98,8 @@ def add_company():
     if not data.get('description'):
         return jsonify({'message': 'La descripción de la compañía es requerida'}), 400
     
-    # Verificar si el nombre de la compañía ya existe
-    if Company.query.filter_by(name=data.get('name')).first():
+    # Verificar si el nombre de la compañía ya existe (catálogo en memoria)
+    if company_catalog.get_by_name(data.get('name')):
         return jsonify({'message': 'Ya existe una compañía con ese nombre'}), 409
     
     # El usuario de contacto es opcional
@@ -106,22 +118,27 @@ def add_company():
     
     # Agregar a la sesión y guardar
     db.session.add(company)
-    db.session.commit()
+    try:
+        invalidate('companies')
+        db.session.commit()
+    except IntegrityError:
+        # Otro request creó el mismo nombre después de revisar el catálogo
+        return _name_taken()
 
-    mexico_time = company.created_at.astimezone(mexico_timezone)
-    
     # Asociar usuarios si se proporcionan
     if 'user_id' in data and data['user_id']:
         users = User.query.filter(User.id.in_([user_id])).all()
         for user in users:
             user.companies.append(company)
+        bump_membership_claims([user.id for user in users])
+        invalidate('user_companies')
         db.session.commit()
 
     response_data = {
         'id': company.id,
         'name': company.name,
         'description': company.description,
-        'created_at': mexico_time.isoformat(), # company.created_at.isoformat(),
+        'created_at': company.created_at,
         'active': company.active       
     }
 
@@ -136,21 +153,58 @@ def add_company():
 
     return jsonify(response_data), 201
 
-@companies_bp.route('/<int:company_id>', methods=['PUT'])
-@jwt_required()
-def update_company(company_id):
-    current_user_id = get_jwt_identity()
+def _name_taken():
+    db.session.rollback()
+    return jsonify({'message': 'Ya existe una compañía con ese nombre'}), 409
+
+# Importar compañías desde un archivo CSV o NDJSON (cuerpo del request)
+@companies_bp.route('/import', methods=['POST'])
+@require_role(ROLE_SUPERADMIN, message='No tienes permisos para importar compañías. Solo los superadministradores pueden realizar esta acción.')
+def import_companies_file():
+    # El formato se toma de ?format= o del Content-Type
+    file_format = request.args.get('format')
+    if not file_format:
+        file_format = 'ndjson' if request.mimetype in NDJSON_MIMETYPES else 'csv'
+    
+    if file_format not in ('csv', 'ndjson'):
+        return jsonify({'message': 'El formato debe ser csv o ndjson'}), 400
+    
+    # Con ?async=true el archivo se guarda en un trabajo y se responde 202 de inmediato
+    if async_requested():
+        if (request.content_length or 0) > current_app.config['JOB_MAX_PAYLOAD_BYTES']:
+            return jsonify({'message': 'El archivo es demasiado grande para importarse en segundo plano'}), 413
+        content = request.get_data().decode('utf-8-sig')
+        job = enqueue('import_companies', {'format': file_format, 'content': content},
+                      created_by=current_claims().id)
+        return job_accepted(job)
     
-    # Verificar que el usuario exista y sea superadmin
-    current_user = User.query.get(current_user_id)
-    if not current_user:
-        return jsonify({'message': 'Usuario no encontrado'}), 404
+    # Se lee el cuerpo como stream, en lotes, sin cargar el archivo completo
+    report = import_companies(iter_import_rows(request.stream, file_format))
     
-    # Validar que sea superadmin
-    role = Role.query.get(current_user.role_id)
-    if not role or role.id != ROLE_SUPERADMIN:
-        return jsonify({'message': 'No tienes permisos para editar compañías. Solo los superadministradores pueden realizar esta acción.'}), 403
+    return jsonify(report.to_dict()), 200
+
+# Pasar a todos los miembros de una compañía a otra (siempre en segundo plano)
+@companies_bp.route('/<int:company_id>/members/move', methods=['POST'])
+@require_role(ROLE_SUPERADMIN, message='No tienes permisos para mover miembros. Solo los superadministradores pueden realizar esta acción.')
+def move_company_members(company_id):
+    data = request.get_json()
+    if not data or not data.get('to_company_id'):
+        return jsonify({'message': 'Se requiere el ID de la compañía destino'}), 400
     
+    to_company_id = data['to_company_id']
+    if to_company_id == company_id:
+        return jsonify({'message': 'La compañía destino debe ser distinta a la de origen'}), 400
+    
+    if not company_catalog.get(company_id) or not company_catalog.get(to_company_id):
+        return jsonify({'message': 'Compañía no encontrada'}), 404
+    
+    job = enqueue('move_members', {'from_company_id': company_id, 'to_company_id': to_company_id},
+                  created_by=current_claims().id)
+    return job_accepted(job)
+
+@companies_bp.route('/<int:company_id>', methods=['PUT'])
+@require_role(ROLE_SUPERADMIN, message='No tienes permisos para editar compañías. Solo los superadministradores pueden realizar esta acción.')
+def update_company(company_id):
     # Obtener la compañía por ID
     company = Company.query.get(company_id)
     
@@ -166,9 +220,14 @@ def update_company(company_id):
     # Actualizar campos si se proporcionan
     if 'name' in data and data['name']:
         # Verificar que el nuevo nombre no exista ya (si se está cambiando)
-        if data['name'] != company.name and Company.query.filter_by(name=data['name']).first():
+        if data['name'] != company.name and company_catalog.get_by_name(data['name']):
             return jsonify({'message': 'Ya existe una compañía con ese nombre'}), 409
         company.name = data['name']
+        # El catálogo puede estar atrasado: la restricción unique confirma el nombre
+        try:
+            db.session.flush()
+        except IntegrityError:
+            return _name_taken()
     
     if 'description' in data and data['description']:
         company.description = data['description']
@@ -182,13 +241,18 @@ def update_company(company_id):
     if 'active' in data:
         company.active = data['active']
 
+    invalidate('companies')
+
     user_id = data.get('user_id')
+    user = None
     
     if 'user_id' in data and data['user_id']:
         users = User.query.filter(User.id.in_([user_id])).all()
-        print(len(users))
         for user in users:
-            user.companies.append(company)
+            if company not in user.companies:
+                user.companies.append(company)
+                bump_membership_claims([user.id])
+        invalidate('user_companies')
         db.session.commit()
     
     # Actualizar usuarios asociados si se proporcionan
@@ -222,13 +286,11 @@ def update_company(company_id):
     # Guardar cambios
     db.session.commit()
 
-    mexico_time = company.created_at.astimezone(mexico_timezone)
-
     response_data = {
         'id': company.id,
         'name': company.name,
         'description': company.description,
-        'created_at': mexico_time.isoformat(), # company.created_at.isoformat(),
+        'created_at': company.created_at,
         'active': company.active
     }
 
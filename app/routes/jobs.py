@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from flask import jsonify, request, url_for, Blueprint
+from app import db
+from app.models.jobs import Job, JOB_QUEUED, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED
+from app.models.roles import ROLE_SUPERADMIN
+from app.jobs import NON_IDEMPOTENT_JOBS, notify_runner
+from app.utils.permissions import current_claims, require_role
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def async_requested():
+    # Las rutas de operaciones largas aceptan ?async=true para solo encolar
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def job_accepted(job):
+    # 202 con la URL donde se consulta el avance
+    location = url_for('jobs.get_job', job_id=job.id)
+    return jsonify(job.to_dict()), 202, {'Location': location}
+
+
+def _get_visible_job(job_id):
+    # Cada usuario ve sus propios trabajos; los superadmins ven todos
+    claims = current_claims()
+    job = db.session.get(Job, job_id)
+    if not job or (job.created_by != claims.id and not claims.has_role(ROLE_SUPERADMIN)):
+        return None
+    return job
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@require_role()
+def get_job(job_id):
+    job = _get_visible_job(job_id)
+    if not job:
+        return jsonify({'message': 'Trabajo no encontrado'}), 404
+    
+    return jsonify(job.to_dict()), 200
+
+
+@jobs_bp.route('/<int:job_id>/cancel', methods=['POST'])
+@require_role()
+def cancel_job(job_id):
+    job = _get_visible_job(job_id)
+    if not job:
+        return jsonify({'message': 'Trabajo no encontrado'}), 404
+    
+    if job.status in (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED):
+        return jsonify({'message': f'El trabajo ya terminó ({job.status})'}), 409
+    
+    # Si aún no empieza se cancela aquí; si ya corre, el worker se detiene
+    # en el siguiente lote y lo marca como cancelado
+    job.cancel_requested = True
+    if job.status == JOB_QUEUED:
+        job.status = JOB_CANCELLED
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify(job.to_dict()), 202
+
+
+@jobs_bp.route('/<int:job_id>/retry', methods=['POST'])
+@require_role()
+def retry_job(job_id):
+    job = _get_visible_job(job_id)
+    if not job:
+        return jsonify({'message': 'Trabajo no encontrado'}), 404
+    
+    if job.status not in (JOB_FAILED, JOB_CANCELLED):
+        return jsonify({'message': 'Solo se pueden reintentar trabajos fallidos o cancelados'}), 409
+    
+    # Repetirlo duplicaría lo que el primer intento alcanzó a hacer
+    if job.kind in NON_IDEMPOTENT_JOBS:
+        return jsonify({'message': 'Este tipo de trabajo no se puede reintentar'}), 409
+    
+    job.status = JOB_QUEUED
+    job.cancel_requested = False
+    job.attempts = 0
+    job.progress = 0
+    job.error = None
+    job.finished_at = None
+    db.session.commit()
+    notify_runner()
+    
+    return jsonify(job.to_dict()), 202
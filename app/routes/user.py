@@ -1,27 +1,41 @@
-from flask import jsonify, request, Blueprint
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db, bcrypt
-from app.models.users import User
+from itertools import islice
+from flask import jsonify, request, Blueprint, current_app
+from flask_jwt_extended import get_jwt_identity
+from app import db
+from app.models.users import User, bump_claims_version, normalize_email, user_loader_options
 from app.models.companies import Company
 from app.models.roles import Role, ROLE_SUPERADMIN, ROLE_ADMIN, ROLE_USER
+from app.bulk.users import BULK_MAX_ITEMS, provision_users
+from app.jobs import enqueue
+from app.read_models.search import SearchParamsError, get_search_params, search_users
+from app.read_models.users import USER_EXPORT_COLUMNS, fetch_users, iter_users, iter_users_export
+from app.routes.jobs import async_requested, job_accepted
+from app.utils.company_catalog import company_catalog
+from app.utils.conditional import conditional_get, invalidate
+from app.utils.instrumentation import query_budget
+from app.utils.passwords import password_hasher
+from app.utils.permissions import current_claims, require_role
+from app.utils.rate_limit import rate_limit
+from app.utils.ndjson import PayloadError, iter_request_items
+from app.utils.pagination import PaginationError, get_page_params, split_page, page_response
+from app.utils.streaming import stream_csv, stream_json_array, stream_ndjson
 
 users_bp = Blueprint('users', __name__)
 
 
 @users_bp.route('/me', methods=['GET'])
-@jwt_required()
+# Consultas fijas: user_loader_options() carga las relaciones en lote (un N+1 pasaría el límite)
+@query_budget(10)
+@require_role()
+@conditional_get('users', 'companies', 'user_companies')
 def get_current_user():
     """
     Obtiene el usuario actual basado en el token JWT.
     Incluye información de relaciones (rol y compañías)
     """
     current_user_id = get_jwt_identity()
-    # Cargamos el usuario con todas sus relaciones en una sola consulta (eager loading)
-    user = User.query.options(
-        db.joinedload(User.role_obj),
-        db.joinedload(User.primary_company),
-        db.joinedload(User.companies)
-    ).filter_by(id=current_user_id).first()
+    # Cargamos el usuario con todas sus relaciones en lote (eager loading)
+    user = User.query.options(*user_loader_options()).filter_by(id=current_user_id).first()
     
     if not user:
         return jsonify({"error": "Usuario no encontrado"}), 404
@@ -32,49 +46,84 @@ def get_current_user():
 
 # Obtener todos los usuarios (para administradores)
 @users_bp.route('/all', methods=['GET'])
-@jwt_required()
+@query_budget(8)
+@require_role(ROLE_SUPERADMIN, ROLE_ADMIN, message='No tienes permisos para ver todos los usuarios')
+@conditional_get('users', 'companies', 'user_companies')
 def get_all_users():
     """
     Obtiene todos los usuarios con sus relaciones.
+    Acepta paginación por cursor con `limit` y `after`; sin esos parámetros
+    regresa la lista completa como antes.
     """
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    # Verificar que sea superadmin o admin
-    if not current_user or current_user.role_id not in [ROLE_SUPERADMIN, ROLE_ADMIN]:
-        return jsonify({'message': 'No tienes permisos para ver todos los usuarios'}), 403
-    
-    # Cargamos todos los usuarios con sus relaciones en una sola consulta
-    users = User.query.options(
-        db.joinedload(User.role_obj),
-        db.joinedload(User.primary_company),
-        db.joinedload(User.companies)
-    ).all()
-    
-    # Usamos el método to_dict actualizado para cada usuario
-    return jsonify([user.to_dict() for user in users]), 200
+    try:
+        page = get_page_params(request.args)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    # El listado se arma con consultas Core de solo lectura (sin hidratar el ORM)
+    if page is None:
+        if current_app.config['STREAM_LIST_RESPONSES']:
+            # Se codifica usuario por usuario, leyendo la tabla en lotes por id
+            return stream_json_array(iter_users()), 200
+        return jsonify(fetch_users()), 200
+    
+    limit, after_id = page
+    users, next_cursor = split_page(fetch_users(after_id, limit + 1), limit)
+    return jsonify(page_response(users, next_cursor, limit)), 200
+
+
+# Exportar el directorio de usuarios (CSV o NDJSON, en streaming)
+@users_bp.route('/export', methods=['GET'])
+@require_role(ROLE_SUPERADMIN, ROLE_ADMIN, message='No tienes permisos para exportar usuarios')
+def export_users():
+    """
+    Descarga todos los usuarios con rol, compañía principal y compañías.
+    Se lee con un cursor del servidor y se envía en pedazos, así que la memoria
+    del worker no depende del número de usuarios.
+    """
+    file_format = request.args.get('format', 'csv')
+    if file_format == 'csv':
+        return stream_csv(iter_users_export(), USER_EXPORT_COLUMNS, 'users.csv'), 200
+    if file_format == 'ndjson':
+        return stream_ndjson(iter_users_export(), 'users.ndjson'), 200
+    return jsonify({'message': 'El formato debe ser csv o ndjson'}), 400
+
+
+# Buscar usuarios para autocompletar (?q=texto&limit=10)
+@users_bp.route('/search', methods=['GET'])
+@require_role(ROLE_SUPERADMIN, ROLE_ADMIN, message='No tienes permisos para buscar usuarios')
+def search_users_route():
+    """
+    Busca por prefijo o subcadena en nombre, apellido y email. Igual que
+    /all, solo para admin y superadmin: los superadmins buscan entre todos los
+    usuarios; los admins solo entre los que comparten alguna compañía con ellos.
+    """
+    try:
+        query, limit = get_search_params(request.args)
+    except SearchParamsError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    claims = current_claims()
+    visible_to = None if claims.has_role(ROLE_SUPERADMIN) else claims.id
+    return jsonify(search_users(query, limit, visible_to)), 200
 
 
 # Obtener usuario por ID
 @users_bp.route('/<int:user_id>', methods=['GET'])
-@jwt_required()
+@query_budget(10)
+@require_role()
 def get_user(user_id):
     """
     Obtiene un usuario específico por su ID con todas sus relaciones.
     """
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    claims = current_claims()
     
     # Verificar permisos: solo el propio usuario o admin/superadmin pueden ver detalles
-    if current_user_id != user_id and current_user.role_id not in [ROLE_SUPERADMIN, ROLE_ADMIN]:
+    if claims.id != user_id and not claims.has_role(ROLE_SUPERADMIN, ROLE_ADMIN):
         return jsonify({'message': 'No tienes permisos para ver este usuario'}), 403
     
     # Cargamos el usuario con todas sus relaciones
-    user = User.query.options(
-        db.joinedload(User.role_obj),
-        db.joinedload(User.primary_company),
-        db.joinedload(User.companies)
-    ).filter_by(id=user_id).first()
+    user = User.query.options(*user_loader_options()).filter_by(id=user_id).first()
     
     if not user:
         return jsonify({"error": "Usuario no encontrado"}), 404
@@ -85,16 +134,16 @@ def get_user(user_id):
 
 # Actualizar usuario
 @users_bp.route('/<int:user_id>', methods=['PUT'])
-@jwt_required()
-def update_user(user_id, data):
+@rate_limit('update_user', per_identity='30/minute')
+@require_role()
+def update_user(user_id):
     """
     Actualiza un usuario existente.
     """
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    claims = current_claims()
     
     # Verificar permisos: solo el propio usuario o admin/superadmin pueden actualizar
-    if current_user_id != user_id and current_user.role_id not in [ROLE_SUPERADMIN, ROLE_ADMIN]:
+    if claims.id != user_id and not claims.has_role(ROLE_SUPERADMIN, ROLE_ADMIN):
         return jsonify({'message': 'No tienes permisos para actualizar este usuario'}), 403
     
     # Obtener datos de la solicitud
@@ -107,15 +156,20 @@ def update_user(user_id, data):
         return jsonify({"error": "Usuario no encontrado"}), 404
     
     # Restricciones adicionales para usuarios normales
-    if current_user.role_id == ROLE_USER and current_user_id == user_id:
+    if claims.role_id == ROLE_USER and claims.id == user_id:
         # Usuarios normales no pueden cambiar su propio rol
         if 'role_id' in data:
             return jsonify({"error": "No tienes permisos para cambiar tu rol"}), 403
     
+    # Rol, estado o compañías: cambian lo que dicen los tokens del usuario
+    permissions_changed = False
+    
     # Actualizar campos
     if 'email' in data:
+        if not isinstance(data['email'], str) or not data['email'].strip():
+            return jsonify({"error": "El email no es válido"}), 400
         # Verificar que el nuevo email no exista ya (si se está cambiando)
-        if data['email'] != user.email and User.query.filter_by(email=data['email']).first():
+        if normalize_email(data['email']) != user.email and User.find_by_email(data['email']):
             return jsonify({"error": "El email ya está registrado"}), 400
         user.email = data['email']
     
@@ -126,18 +180,20 @@ def update_user(user_id, data):
         user.lastname = data['lastname']
     
     # Solo admin/superadmin pueden cambiar roles
-    if 'role_id' in data and current_user.role_id in [ROLE_SUPERADMIN, ROLE_ADMIN]:
+    if 'role_id' in data and claims.has_role(ROLE_SUPERADMIN, ROLE_ADMIN):
         # Admins no pueden crear superadmins
-        if current_user.role_id == ROLE_ADMIN and int(data['role_id']) == ROLE_SUPERADMIN:
+        if claims.role_id == ROLE_ADMIN and int(data['role_id']) == ROLE_SUPERADMIN:
             return jsonify({"error": "Los administradores no pueden asignar rol de superadmin"}), 403
+        permissions_changed = data['role_id'] != user.role_id
         user.role_id = data['role_id']
     
-    if 'active' in data and current_user.role_id in [ROLE_SUPERADMIN, ROLE_ADMIN]:
+    if 'active' in data and claims.has_role(ROLE_SUPERADMIN, ROLE_ADMIN):
+        permissions_changed = permissions_changed or bool(data['active']) != bool(user.active)
         user.active = data['active']
     
     if 'primary_company_id' in data:
         # Verificar que la compañía exista
-        if not Company.query.get(data['primary_company_id']):
+        if not company_catalog.get(data['primary_company_id']):
             return jsonify({"error": "Compañía principal no encontrada"}), 404
         
         # Verificar que el usuario esté asociado a esta compañía
@@ -148,7 +204,7 @@ def update_user(user_id, data):
         user.primary_company_id = data['primary_company_id']
     
     # Actualizar compañías asociadas (solo admin/superadmin)
-    if 'companies' in data and current_user.role_id in [ROLE_SUPERADMIN, ROLE_ADMIN]:
+    if 'companies' in data and claims.has_role(ROLE_SUPERADMIN, ROLE_ADMIN):
         # Verificar que todas las compañías existan
         company_ids = data['companies']
         if company_ids:
@@ -158,13 +214,15 @@ def update_user(user_id, data):
                 return jsonify({"error": "Una o más compañías no fueron encontradas"}), 404
             
             # Si es admin, solo puede asignar compañías a las que tiene acceso
-            if current_user.role_id == ROLE_ADMIN:
-                admin_company_ids = [c.id for c in current_user.companies]
-                for company_id in company_ids:
-                    if company_id not in admin_company_ids:
-                        return jsonify({"error": f"No tienes acceso a la compañía {company_id}"}), 403
+            if claims.role_id == ROLE_ADMIN:
+                missing_ids = claims.missing_companies(company_ids)
+                if missing_ids:
+                    return jsonify({"error": f"No tienes acceso a la compañía {missing_ids[0]}"}), 403
             
             # Limpiar asociaciones existentes y agregar las nuevas
+            # company_ids del token solo cuenta para los admins (ver bump_membership_claims)
+            permissions_changed = permissions_changed or (
+                user.role_id == ROLE_ADMIN and {c.id for c in user.companies} != set(company_ids))
             user.companies = []
             user.companies.extend(companies)
             
@@ -175,37 +233,33 @@ def update_user(user_id, data):
     
     # Si se proporciona contraseña, actualizarla
     if 'password' in data and data['password']:
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
-        user.password = hashed_password
-    
+        if not isinstance(data['password'], str):
+            return jsonify({"error": "La contraseña no es válida"}), 400
+        user.password = password_hasher.hash(data['password'])
+    
+    # Los tokens que el usuario ya tiene traen los permisos anteriores
+    if permissions_changed:
+        bump_claims_version([user.id])
+    invalidate('users', 'user_companies')
     db.session.commit()
     
     # Recargar el usuario con todas sus relaciones
-    updated_user = User.query.options(
-        db.joinedload(User.role_obj),
-        db.joinedload(User.primary_company),
-        db.joinedload(User.companies)
-    ).filter_by(id=user_id).first()
+    updated_user = User.query.options(*user_loader_options()).filter_by(id=user_id).first()
     
     return jsonify(updated_user.to_dict()), 200
 
 
 # Eliminar usuario
 @users_bp.route('/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@require_role(ROLE_SUPERADMIN, ROLE_ADMIN, message='No tienes permisos para desactivar usuarios')
 def delete_user(user_id):
     """
     Elimina un usuario (desactivación lógica).
     """
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    # Solo admin/superadmin pueden desactivar usuarios
-    if current_user.role_id not in [ROLE_SUPERADMIN, ROLE_ADMIN]:
-        return jsonify({'message': 'No tienes permisos para desactivar usuarios'}), 403
+    claims = current_claims()
     
     # No se puede desactivar a uno mismo
-    if current_user_id == user_id:
+    if claims.id == user_id:
         return jsonify({'message': 'No puedes desactivar tu propia cuenta'}), 400
     
     user = User.query.get(user_id)
@@ -213,28 +267,26 @@ def delete_user(user_id):
         return jsonify({"error": "Usuario no encontrado"}), 404
     
     # No se puede desactivar un superadmin siendo admin
-    if current_user.role_id == ROLE_ADMIN and user.role_id == ROLE_SUPERADMIN:
+    if claims.role_id == ROLE_ADMIN and user.role_id == ROLE_SUPERADMIN:
         return jsonify({'message': 'No tienes permisos para desactivar a un superadministrador'}), 403
     
     # Desactivación lógica en lugar de eliminación física
     user.active = False
+    bump_claims_version([user.id])
+    invalidate('users')
     db.session.commit()
     
     return jsonify({"message": "Usuario desactivado correctamente"}), 200
 
 # Crear usuarios nuevos como superadmin y admin
 @users_bp.route('/create', methods=['POST'])
-@jwt_required()
-def create_user(data):
+@rate_limit('create_user', per_identity='60/minute')
+@require_role(ROLE_SUPERADMIN, ROLE_ADMIN, message='No tienes permisos para crear usuarios')
+def create_user():
     """
     Crea un nuevo usuario.
     """
-    current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
-    
-    # Verificar que sea superadmin o admin
-    if not current_user or current_user.role_id not in [ROLE_SUPERADMIN, ROLE_ADMIN]:
-        return jsonify({'message': 'No tienes permisos para crear usuarios'}), 403
+    claims = current_claims()
     
     data = request.get_json()
     
@@ -242,15 +294,20 @@ def create_user(data):
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'message': 'Faltan campos requeridos (email y password)'}), 400
     
+    if not isinstance(data['email'], str):
+        return jsonify({'message': 'El email no es válido'}), 400
+    if not isinstance(data['password'], str):
+        return jsonify({'message': 'La contraseña no es válida'}), 400
+    
     # Verificar si el email ya existe
-    if User.query.filter_by(email=data.get('email')).first():
+    if User.find_by_email(data['email']):
         return jsonify({"error": "El email ya está registrado"}), 400
     
     # Validar rol solicitado
     role_id = data.get('role_id', ROLE_USER)
     
     # Restricciones según rol del creador
-    if current_user.role_id == ROLE_ADMIN:
+    if claims.role_id == ROLE_ADMIN:
         # Los admin pueden crear usuarios y otros admin, pero no superadmin
         if int(role_id) == ROLE_SUPERADMIN:
             return jsonify({'message': 'Los administradores no pueden crear superadmins'}), 403
@@ -260,20 +317,19 @@ def create_user(data):
     primary_company_id = data.get('primary_company_id')
     
     # Si es admin, solo puede asignar compañías a las que tiene acceso
-    if current_user.role_id == ROLE_ADMIN and company_ids:
-        admin_company_ids = [c.id for c in current_user.companies]
-        for company_id in company_ids:
-            if company_id not in admin_company_ids:
-                return jsonify({
-                    'message': f'No tienes acceso a la compañía con ID {company_id}'
-                }), 403
+    if claims.role_id == ROLE_ADMIN and company_ids:
+        missing_ids = claims.missing_companies(company_ids)
+        if missing_ids:
+            return jsonify({
+                'message': f'No tienes acceso a la compañía con ID {missing_ids[0]}'
+            }), 403
     
     # Verificar que la compañía principal sea parte de las compañías asociadas
     if primary_company_id and company_ids and primary_company_id not in company_ids:
         return jsonify({'message': 'La compañía principal debe ser una de las compañías asociadas'}), 400
     
     # Crear el nuevo usuario
-    hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    hashed_password = password_hasher.hash(data['password'])
     new_user = User(
         email=data.get('email'),
         password=hashed_password,
@@ -289,20 +345,59 @@ def create_user(data):
         new_user.companies.extend(companies)
     
     db.session.add(new_user)
+    invalidate('users', 'user_companies')
     db.session.commit()
     
     # Cargar el usuario recién creado con todas sus relaciones
-    created_user = User.query.options(
-        db.joinedload(User.role_obj),
-        db.joinedload(User.primary_company),
-        db.joinedload(User.companies)
-    ).filter_by(id=new_user.id).first()
+    created_user = User.query.options(*user_loader_options()).filter_by(id=new_user.id).first()
     
     return jsonify(created_user.to_dict()), 201
 
 
+# Crear usuarios en lote (arreglo JSON o NDJSON)
+@users_bp.route('/bulk', methods=['POST'])
+@rate_limit('bulk_users', per_identity='10/minute')
+@require_role(ROLE_SUPERADMIN, ROLE_ADMIN, message='No tienes permisos para crear usuarios')
+def bulk_create_users():
+    """
+    Crea varios usuarios en una sola transacción con las mismas reglas que
+    create_user. Regresa un resultado por elemento.
+    """
+    claims = current_claims()
+    
+    try:
+        items = list(islice(iter_request_items(), BULK_MAX_ITEMS + 1))
+    except PayloadError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    if not items:
+        return jsonify({'message': 'No se proporcionaron usuarios'}), 400
+    
+    if len(items) > BULK_MAX_ITEMS:
+        return jsonify({'message': f'Se pueden crear como máximo {BULK_MAX_ITEMS} usuarios por solicitud'}), 413
+    
+    # Con ?async=true se encola y se responde 202; el resultado queda en el trabajo
+    # (un solo intento, ver bulk_users_job)
+    if async_requested():
+        job = enqueue('bulk_users', {
+            'items': items,
+            'role_id': claims.role_id,
+            'company_ids': sorted(claims.company_ids)
+        }, created_by=claims.id)
+        return job_accepted(job)
+    
+    results = provision_users(items, claims.role_id, claims.company_ids)
+    created = sum(1 for result in results if result['status'] == 'created')
+    
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 201 if created else 400
+
+
 @users_bp.route('/primary-company', methods=['PUT'])
-@jwt_required()
+@require_role()
 def update_my_primary_company():
     current_user_id = get_jwt_identity()
     current_user = User.query.get(current_user_id)
@@ -323,7 +418,7 @@ def update_my_primary_company():
         return jsonify({'message': 'El ID de la compañía principal es requerido y no puede ser null'}), 400
     
     # Verificar que la compañía exista
-    company = Company.query.get(primary_company_id)
+    company = company_catalog.get(primary_company_id)
     if not company:
         return jsonify({'message': 'Compañía no encontrada'}), 404
     
@@ -339,14 +434,11 @@ def update_my_primary_company():
     
     # Actualizar la compañía principal
     current_user.primary_company_id = primary_company_id
+    invalidate('users')
     db.session.commit()
     
     # Recargar el usuario con todas sus relaciones
-    updated_user = User.query.options(
-        db.joinedload(User.role_obj),
-        db.joinedload(User.primary_company),
-        db.joinedload(User.companies)
-    ).filter_by(id=current_user_id).first()
+    updated_user = User.query.options(*user_loader_options()).filter_by(id=current_user_id).first()
     
     return jsonify({
         'message': 'Compañía principal actualizada correctamente',
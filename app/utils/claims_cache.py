@@ -0,0 +1,62 @@
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+from app.models.cache_versions import get_versions
+from app.models.users import CLAIMS_VERSION_NAME, User
+
+
+class ClaimsVersionCache:
+    """
+    Copia en memoria (por worker) de users.claims_version, para que
+    require_role no consulte la base de datos en cada request.
+
+    bump_claims_version asigna a los usuarios el nuevo valor del contador
+    `claims` de cache_versions. Cada worker revisa ese contador como máximo cada
+    CLAIMS_CACHE_MAX_STALENESS segundos y, si cambió, lee solo los usuarios con
+    claims_version mayor al último contador que vio (ix_users_claims_version).
+    Un token revocado puede seguir valiendo en un worker hasta ese límite.
+    Solo se guardan los usuarios cuyos permisos cambiaron alguna vez; el resto
+    sigue en 0, igual que en sus tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _ensure_fresh(self):
+        max_staleness = current_app.config.get('CLAIMS_CACHE_MAX_STALENESS', 5)
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < max_staleness:
+            return
+
+        with self._lock:
+            version = get_versions(CLAIMS_VERSION_NAME)[CLAIMS_VERSION_NAME]
+            if version != self._version:
+                # Un contador menor es otra base de datos: se vuelve a leer todo
+                if self._version is None or version < self._version:
+                    self._versions = self._load(0)
+                else:
+                    self._versions.update(self._load(self._version))
+                self._version = version
+            self._checked_at = now
+
+    def _load(self, after_version):
+        users_t = User.__table__
+        rows = db.session.execute(
+            db.select(users_t.c.id, users_t.c.claims_version)
+            .where(users_t.c.claims_version > after_version)
+        )
+        return {user_id: version for user_id, version in rows}
+
+    def get(self, user_id):
+        """claims_version vigente de `user_id` (con el atraso descrito arriba)"""
+        self._ensure_fresh()
+        return self._versions.get(user_id, 0)
+
+
+claims_versions = ClaimsVersionCache()
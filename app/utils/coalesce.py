@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from app.utils.metrics import record_coalesce
+from app.utils.permissions import current_claims
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = True
+
+
+class SingleFlight:
+    """
+    Agrupa solicitudes GET idénticas y simultáneas dentro de un worker: la
+    primera ejecuta la ruta y las demás esperan y reciben los mismos bytes ya
+    codificados. Opcionalmente el resultado se reutiliza durante `ttl` segundos;
+    los resultados vencidos se borran al leerlos y en un barrido cada
+    SWEEP_INTERVAL segundos.
+
+    Si `shareable(resultado)` es falso (p. ej. una respuesta en streaming), el
+    resultado solo es del primero: los que esperaban ejecutan la ruta por su
+    cuenta y no se guarda. Los contadores también se exportan en /metrics.
+    """
+
+    SWEEP_INTERVAL = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._results = {}
+        self._next_sweep = 0.0
+        self._stats = defaultdict(lambda: {'executed': 0, 'coalesced': 0, 'cached': 0, 'unshared': 0})
+
+    def _count(self, endpoint, outcome):
+        self._stats[endpoint][outcome] += 1
+        record_coalesce(endpoint, outcome)
+
+    def _sweep(self, now):
+        """Borra los resultados vencidos; se llama con el lock tomado"""
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        expired = [key for key, (expires_at, _) in self._results.items() if expires_at <= now]
+        for key in expired:
+            del self._results[key]
+
+    def run(self, key, ttl, compute, shareable=None):
+        endpoint = key[0]
+        with self._lock:
+            cached = self._results.get(key)
+            if cached:
+                if cached[0] > time.monotonic():
+                    self._count(endpoint, 'cached')
+                    return cached[1]
+                del self._results[key]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._count(endpoint, 'executed')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                with self._lock:
+                    self._count(endpoint, 'coalesced')
+                raise flight.error
+            if not flight.shared:
+                with self._lock:
+                    self._count(endpoint, 'unshared')
+                return compute()
+            with self._lock:
+                self._count(endpoint, 'coalesced')
+            return flight.result
+
+        try:
+            flight.result = compute()
+            flight.shared = shareable is None or shareable(flight.result)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                now = time.monotonic()
+                if ttl and flight.error is None and flight.shared:
+                    self._results[key] = (now + ttl, flight.result)
+                if now >= self._next_sweep:
+                    self._sweep(now)
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'endpoints': {endpoint: dict(counts) for endpoint, counts in self._stats.items()},
+                'cached_results': len(self._results)
+            }
+
+
+single_flight = SingleFlight()
+
+
+def _identity_scope():
+    return current_claims().id
+
+
+def _is_buffered(result):
+    return not isinstance(result, Response)
+
+
+def coalesce(ttl=0, scope=_identity_scope, buffer_streamed=False):
+    """
+    Activa la agrupación de solicitudes para una ruta GET. `scope` regresa el
+    alcance de autorización efectivo: solo se comparten respuestas entre
+    solicitudes con el mismo alcance (por defecto, el mismo usuario). Las
+    respuestas en streaming no se agrupan, salvo con `buffer_streamed`: el
+    primero las lee completas y comparte los bytes, pensado para listados
+    chicos que se piden muchas veces a la vez. Va debajo de @require_role.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, request.query_string, scope())
+
+            def compute():
+                response = make_response(fn(*args, **kwargs))
+                if response.is_streamed and not buffer_streamed:
+                    # El cuerpo se genera al enviarlo; compartirlo obligaría a cargarlo completo
+                    return response
+                return response.status_code, list(response.headers), response.get_data()
+
+            result = single_flight.run(key, ttl, compute, shareable=_is_buffered)
+            if isinstance(result, Response):
+                return result
+            status, headers, body = result
+            return Response(body, status=status, headers=headers)
+        return wrapper
+    return decorator
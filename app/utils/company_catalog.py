@@ -0,0 +1,108 @@
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+from app.models.cache_versions import bump_version, get_versions
+from app.models.companies import Company
+from app.utils.metrics import record_company_catalog
+
+VERSION_NAME = 'companies'
+
+
+class CompanyCatalog:
+    """
+    Copia en memoria (por worker) del catálogo de compañías, por id y por nombre.
+
+    Cada escritura a compañías llama invalidate(), que incrementa el contador
+    `companies` de cache_versions en la misma transacción. Los demás workers
+    revisan ese contador como máximo cada COMPANY_CACHE_MAX_STALENESS segundos
+    y recargan el catálogo si cambió, así que nunca sirven datos más viejos que
+    ese límite. Funciona igual en Postgres y en SQLite. Por ese atraso, las
+    revisiones de nombre repetido con get_by_name() son solo un atajo: la
+    restricción unique de la tabla es la que decide. Los contadores de stats()
+    también se exportan en /metrics (company_catalog_lookups_total).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_name = {}
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _ensure_fresh(self):
+        max_staleness = current_app.config.get('COMPANY_CACHE_MAX_STALENESS', 5)
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < max_staleness:
+            self.hits += 1
+            record_company_catalog('hit')
+            return
+
+        with self._lock:
+            version = get_versions(VERSION_NAME)[VERSION_NAME]
+            if version != self._version:
+                self._load()
+                self._version = version
+            else:
+                self.hits += 1
+                record_company_catalog('hit')
+            self._checked_at = now
+
+    def _load(self):
+        companies_t = Company.__table__
+        rows = db.session.execute(
+            db.select(
+                companies_t.c.id, companies_t.c.name, companies_t.c.description,
+                companies_t.c.user_id, companies_t.c.created_at, companies_t.c.active
+            ).order_by(companies_t.c.id)
+        )
+        by_id = {}
+        for company_id, name, description, user_id, created_at, active in rows:
+            by_id[company_id] = {
+                'id': company_id,
+                'name': name,
+                'description': description,
+                'user_id': user_id,
+                'created_at': created_at,
+                'active': active
+            }
+        self._by_id = by_id
+        self._by_name = {company['name']: company for company in by_id.values()}
+        self.misses += 1
+        self.reloads += 1
+        record_company_catalog('reload')
+
+    def get(self, company_id):
+        """Compañía por id (dict de solo lectura) o None"""
+        self._ensure_fresh()
+        return self._by_id.get(company_id)
+
+    def get_by_name(self, name):
+        """Compañía por nombre exacto (dict de solo lectura) o None"""
+        self._ensure_fresh()
+        return self._by_name.get(name)
+
+    def invalidate(self):
+        """
+        Marca el catálogo como modificado. Se llama antes del commit de la
+        escritura para que el contador cambie en la misma transacción.
+        """
+        bump_version(VERSION_NAME)
+        self._version = None
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'size': len(self._by_id),
+            'version': self._version
+        }
+
+
+company_catalog = CompanyCatalog()
@@ -0,0 +1,57 @@
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+from app.models.cache_versions import bump_version, get_versions
+from app.utils.company_catalog import company_catalog
+from app.utils.permissions import current_claims
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def invalidate(*tables):
+    """
+    Hook para las rutas de escritura: marca las tablas como modificadas dentro
+    de la transacción actual (llamar antes del commit). Cambia los ETags de las
+    respuestas que dependen de ellas y refresca el catálogo de compañías.
+    """
+    for table in tables:
+        if table == 'companies':
+            company_catalog.invalidate()
+        else:
+            bump_version(table)
+
+
+def conditional_get(*tables):
+    """
+    Responde 304 Not Modified si el cliente ya tiene la versión actual.
+    El ETag se calcula con los contadores de cambios de `tables` (una consulta a
+    cache_versions), la ruta, sus parámetros y el usuario del token, así que la
+    respuesta 304 no carga ni serializa ninguna fila. Va debajo de @require_role.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(*tables)
+            key = '|'.join([
+                request.endpoint,
+                request.query_string.decode('latin-1'),
+                str(current_claims().id),
+                *(f'{table}:{versions[table]}' for table in tables)
+            ])
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            response.vary.add('Authorization')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Límites (ms) del histograma de espera al pedir una conexión al pool
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def engine_options_from_env(database_uri):
+    """
+    Opciones del engine (SQLALCHEMY_ENGINE_OPTIONS) según las variables de entorno.
+
+    - DB_EXTERNAL_POOLER=true: hay un pooler externo (p. ej. PgBouncer), así que
+      cada request abre y cierra su conexión (NullPool).
+    - DB_POOL_SIZE: por defecto los hilos que pueden usar la base de datos en el
+      proceso (GUNICORN_THREADS o ASGI_THREADS, más JOB_WORKERS si los trabajos
+      corren en el proceso web). Cada hilo usa una conexión a la vez, así que
+      no hace falta más.
+    - DB_MAX_CONNECTIONS: presupuesto de conexiones de todos los procesos; el
+      pool de cada uno se limita a DB_MAX_CONNECTIONS // WEB_CONCURRENCY.
+    - DB_MAX_OVERFLOW: conexiones extra sobre el pool (0 por defecto, para que
+      el total no pase de WEB_CONCURRENCY * pool).
+    - DB_POOL_TIMEOUT, DB_POOL_RECYCLE (segundos) y DB_POOL_PRE_PING.
+    """
+    if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+
+    if _env_bool('DB_EXTERNAL_POOLER', 'false'):
+        return {'poolclass': NullPool}
+
+    if 'DB_POOL_SIZE' in os.environ:
+        pool_size = int(os.environ['DB_POOL_SIZE'])
+    else:
+        threads = int(os.environ.get('GUNICORN_THREADS') or os.environ.get('ASGI_THREADS') or 1)
+        job_threads = 0
+        if os.environ.get('JOB_RUNNER', 'thread') == 'thread':
+            job_threads = int(os.environ.get('JOB_WORKERS', 1))
+        pool_size = max(2, threads + job_threads)
+
+    if os.environ.get('DB_MAX_CONNECTIONS'):
+        processes = int(os.environ.get('WEB_CONCURRENCY', 1))
+        pool_size = min(pool_size, max(1, int(os.environ['DB_MAX_CONNECTIONS']) // processes))
+    max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', 0))
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', 'true')
+    }
+
+
+class PoolTelemetry:
+    """Contadores del pool de conexiones de este proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+
+    def record_wait(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self.wait_counts[bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+            self.wait_total += ms
+            self.wait_max = max(self.wait_max, ms)
+
+    def attach(self, engine):
+        """Escucha los eventos del pool del engine"""
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(engine, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+
+        @event.listens_for(engine, 'invalidate')
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations += 1
+
+        @event.listens_for(engine, 'soft_invalidate')
+        def on_soft_invalidate(dbapi_connection, connection_record, exception):
+            self.soft_invalidations += 1
+
+    def stats(self, engine):
+        pool = engine.pool
+        data = {
+            'pool_class': type(pool).__name__,
+            'checkouts': self.checkouts,
+            'connects': self.connects,
+            'invalidations': self.invalidations,
+            'soft_invalidations': self.soft_invalidations,
+            'timeouts': self.timeouts
+        }
+        if isinstance(pool, QueuePool):
+            data.update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                # Negativo mientras el pool aún no abre todas sus conexiones base
+                'overflow': pool.overflow(),
+                'max_overflow': pool._max_overflow,
+                'timeout_s': pool.timeout()
+            })
+
+        waits = sum(self.wait_counts)
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(WAIT_BUCKETS_MS + ('+Inf',), self.wait_counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        data['checkout_wait_ms'] = {
+            'count': waits,
+            'avg': self.wait_total / waits if waits else 0.0,
+            'max': self.wait_max,
+            'buckets': buckets
+        }
+        return data
+
+
+pool_telemetry = PoolTelemetry()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout y cuántos llegan al timeout"""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_telemetry.timeouts += 1
+            raise
+        finally:
+            pool_telemetry.record_wait(time.perf_counter() - started_at)
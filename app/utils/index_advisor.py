@@ -0,0 +1,172 @@
+from sqlalchemy import inspect
+from sqlalchemy.sql.util import find_tables
+
+from app import db
+from app.models.companies import Company
+from app.models.jobs import JOB_QUEUED, Job
+from app.models.roles import ROLE_SUPERADMIN
+from app.models.users import User, email_key, normalize_email, user_companies
+from app.read_models.companies import companies_page_select
+from app.read_models.users import memberships_select, users_page_select
+
+# Revisa los planes de las consultas más frecuentes de la app con EXPLAIN
+# (Postgres) o EXPLAIN QUERY PLAN (SQLite) y reporta las tablas que se leen
+# completas, junto con las llaves foráneas que no tienen índice. Un recorrido
+# completo solo cuenta como problema si la tabla tiene al menos `min_rows` filas:
+# con pocas filas el planeador lo prefiere aunque exista el índice.
+
+PAGE_SIZE = 50
+
+users_t = User.__table__
+companies_t = Company.__table__
+jobs_t = Job.__table__
+
+
+class QueryPlan:
+    def __init__(self, name, description, plan, scans):
+        self.name = name
+        self.description = description
+        self.plan = plan
+        # Lista de (tabla, filas) que el plan recorre completas
+        self.scans = scans
+
+    @property
+    def ok(self):
+        return not self.scans
+
+
+def _samples():
+    """Valores reales para los parámetros (los planes dependen de ellos)"""
+    session = db.session
+    user_id, email = session.execute(
+        db.select(user_companies.c.user_id, users_t.c.email)
+        .join(users_t, users_t.c.id == user_companies.c.user_id).limit(1)
+    ).first() or (1, 'usuario@example.com')
+    company_id = session.execute(db.select(companies_t.c.id).limit(1)).scalar() or 1
+    return {'user_id': user_id, 'email': email, 'company_id': company_id}
+
+
+def hot_queries():
+    """(nombre, descripción, consulta, tablas que se pueden recorrer sin problema)"""
+    sample = _samples()
+    return [
+        # La paginación por llave lee `users` en orden de id y se detiene en el límite
+        ('users.page', 'GET /api/users/all (una página)',
+         users_page_select(limit=PAGE_SIZE), {'users'}),
+        ('users.memberships', 'compañías de una página de usuarios',
+         memberships_select([sample['user_id']]), set()),
+        ('companies.page', 'GET /api/companies/all de un superadmin',
+         companies_page_select(limit=PAGE_SIZE), {'companies'}),
+        ('companies.visible_to', 'GET /api/companies/all de un usuario',
+         companies_page_select(visible_to=sample['user_id'], limit=PAGE_SIZE), set()),
+        ('auth.login', 'POST /api/login (usuario por email)',
+         db.select(users_t).where(email_key(users_t) == normalize_email(sample['email'])), set()),
+        ('companies.members', 'miembros de una compañía (Company.users)',
+         db.select(user_companies.c.user_id).where(user_companies.c.company_id == sample['company_id']),
+         set()),
+        ('companies.primary_users', 'usuarios con una compañía principal',
+         db.select(users_t.c.id).where(users_t.c.primary_company_id == sample['company_id']), set()),
+        ('companies.by_contact', 'compañías de un usuario de contacto',
+         db.select(companies_t.c.id).where(companies_t.c.user_id == sample['user_id']), set()),
+        ('users.by_role', 'usuarios de un rol',
+         db.select(users_t.c.id).where(users_t.c.role_id == ROLE_SUPERADMIN), set()),
+        ('jobs.claim', 'siguiente trabajo en cola (flask worker)',
+         db.select(jobs_t.c.id).where(jobs_t.c.status == JOB_QUEUED).order_by(jobs_t.c.id).limit(1),
+         set()),
+    ]
+
+
+def table_counts(tables):
+    return {
+        table: db.session.execute(db.select(db.func.count()).select_from(db.table(table))).scalar()
+        for table in tables
+    }
+
+
+def _compile(stmt, dialect):
+    return str(stmt.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _aliases(stmt):
+    """Nombre con el que aparece cada tabla en el plan -> nombre real"""
+    aliases = {}
+    for selectable in find_tables(stmt, include_aliases=True):
+        element = getattr(selectable, 'element', selectable)
+        aliases[selectable.name] = element.name
+    return aliases
+
+
+def _explain_postgresql(connection, stmt):
+    sql = _compile(stmt, connection.dialect)
+    plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + sql).scalar()
+    lines, scanned = [], []
+
+    def walk(node, depth):
+        relation = node.get('Relation Name')
+        label = node['Node Type']
+        if relation:
+            label += f' on {relation}'
+            if node.get('Index Name'):
+                label += f' using {node["Index Name"]}'
+        lines.append('  ' * depth + label)
+        if node['Node Type'] == 'Seq Scan':
+            scanned.append(relation)
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'], 0)
+    return lines, scanned
+
+
+def _explain_sqlite(connection, stmt):
+    sql = _compile(stmt, connection.dialect)
+    aliases = _aliases(stmt)
+    lines, scanned = [], []
+    for _, _, _, detail in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql):
+        lines.append(detail)
+        # "SCAN users" lee la tabla completa; "SEARCH ..." o "... USING INDEX" no
+        words = detail.split()
+        if words[:1] == ['SCAN'] and len(words) > 1 and 'INDEX' not in words:
+            scanned.append(aliases.get(words[1], words[1]))
+    return lines, scanned
+
+
+def explain_hot_queries(min_rows=1000):
+    """Regresa un QueryPlan por cada consulta de hot_queries()"""
+    connection = db.session.connection()
+    explain = _explain_postgresql if connection.dialect.name == 'postgresql' else _explain_sqlite
+    queries = hot_queries()
+    tables = {table for _, _, stmt, _ in queries for table in _aliases(stmt).values()}
+    counts = table_counts(tables)
+
+    plans = []
+    for name, description, stmt, allowed in queries:
+        lines, scanned = explain(connection, stmt)
+        scans = [(table, counts.get(table, 0)) for table in dict.fromkeys(scanned)
+                 if table not in allowed and counts.get(table, 0) >= min_rows]
+        plans.append(QueryPlan(name, description, lines, scans))
+    return plans
+
+
+def unindexed_foreign_keys():
+    """
+    Llaves foráneas de los modelos sin un índice (o llave primaria) que empiece
+    por su columna. Regresa una lista de (tabla, columnas, filas).
+    """
+    inspector = inspect(db.session.connection())
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.tables.values():
+        if table.name not in existing:
+            continue
+        prefixes = [tuple(index['column_names']) for index in inspector.get_indexes(table.name)]
+        prefixes += [tuple(constraint['column_names'])
+                     for constraint in inspector.get_unique_constraints(table.name)]
+        prefixes.append(tuple(inspector.get_pk_constraint(table.name)['constrained_columns']))
+        for fk in inspector.get_foreign_keys(table.name):
+            columns = tuple(fk['constrained_columns'])
+            if not any(prefix[:len(columns)] == columns for prefix in prefixes):
+                missing.append((table.name, columns))
+
+    counts = table_counts({table for table, _ in missing})
+    return [(table, columns, counts[table]) for table, columns in missing]
@@ -0,0 +1,125 @@
+import random
+import re
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Listas de parámetros (IN con N valores, VALUES de inserts de varias filas) se
+# colapsan para que la misma consulta con distinto número de ids cuente igual
+_PARAM_LIST = re.compile(
+    r'\(\s*(?:\?|%\(\w+\)s|%s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|\$\d+|:\w+))*\s*\)'
+)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Una ruta hizo más consultas que su presupuesto (solo con SQL_QUERY_BUDGET_STRICT)"""
+
+
+def fingerprint(statement):
+    return _PARAM_LIST.sub('(?)', _WHITESPACE.sub(' ', statement)).strip()
+
+
+def query_budget(limit):
+    """Presupuesto de consultas propio de una vista (por defecto SQL_QUERY_BUDGET)"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.phases = Counter()
+
+
+def _current():
+    # Solo se mide dentro de requests muestreados; fuera de un request (trabajos,
+    # comandos) o sin muestreo esto regresa None y los eventos no hacen nada
+    if has_request_context():
+        return g.get('_timings')
+    return None
+
+
+def record_phase(name, seconds):
+    """Suma tiempo a una fase del request actual (aparece en Server-Timing)"""
+    timings = _current()
+    if timings is not None:
+        timings.phases[name] += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current() is not None:
+        context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current()
+    started_at = getattr(context, '_query_started_at', None)
+    if timings is None or started_at is None:
+        return
+    timings.queries += 1
+    timings.db_time += time.perf_counter() - started_at
+    timings.fingerprints[fingerprint(statement)] += 1
+
+
+def init_instrumentation(app, engine):
+    """
+    Mide cada request muestreado (SQL_SAMPLE_RATE): número de consultas,
+    tiempo en la base de datos y consultas repetidas, más las fases `hash` y
+    `serialize`. Agrega el header Server-Timing y registra un warning si la
+    ruta pasa su presupuesto de consultas o repite la misma consulta más de
+    SQL_REPEAT_THRESHOLD veces (típico de N+1). Con SQL_QUERY_BUDGET_STRICT
+    (pruebas, desarrollo) pasar el presupuesto lanza QueryBudgetExceeded.
+
+    Las respuestas en streaming hacen sus consultas después de enviar los
+    headers, así que esas no se cuentan.
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timings():
+        if app.config['SQL_INSTRUMENTATION'] and random.random() < app.config['SQL_SAMPLE_RATE']:
+            g._timings = RequestTimings()
+
+    @app.after_request
+    def finish_timings(response):
+        timings = g.pop('_timings', None)
+        if timings is None:
+            return response
+        # Medición cerrada; la usan otros consumidores (p. ej. las métricas)
+        g.request_timings = timings
+
+        total = time.perf_counter() - timings.started_at
+        metrics = [f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"']
+        for name, seconds in sorted(timings.phases.items()):
+            metrics.append(f'{name};dur={seconds * 1000:.1f}')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(metrics)
+
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', app.config['SQL_QUERY_BUDGET'])
+        repeated = [
+            (statement, count) for statement, count in timings.fingerprints.most_common(3)
+            if count > app.config['SQL_REPEAT_THRESHOLD']
+        ]
+
+        if timings.queries > budget or repeated:
+            details = '; '.join(f'{count}x {statement[:200]}' for statement, count in repeated)
+            app.logger.warning(
+                f'{request.method} {request.path}: {timings.queries} consultas '
+                f'(presupuesto {budget}), {timings.db_time * 1000:.1f} ms en la base de datos'
+                + (f'. Repetidas: {details}' if details else '')
+            )
+            if timings.queries > budget and app.config['SQL_QUERY_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(
+                    f'{request.endpoint} hizo {timings.queries} consultas (presupuesto {budget})'
+                )
+        return response
@@ -0,0 +1,174 @@
+import hmac
+import os
+import time
+
+from flask import Response, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover - prometheus_client es opcional
+    prometheus_client = None
+
+# Límites (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+if prometheus_client is not None:
+    REQUESTS = prometheus_client.Counter(
+        'http_requests_total', 'Requests atendidos', ['endpoint', 'method', 'status']
+    )
+    LATENCY = prometheus_client.Histogram(
+        'http_request_duration_seconds', 'Duración de los requests', ['endpoint'],
+        buckets=LATENCY_BUCKETS
+    )
+    IN_FLIGHT = prometheus_client.Gauge(
+        'http_requests_in_flight', 'Requests en curso', ['endpoint'],
+        multiprocess_mode='livesum'
+    )
+    PHASE = prometheus_client.Histogram(
+        'http_request_phase_seconds',
+        'Tiempo por fase (db, hash, serialize) en los requests muestreados',
+        ['endpoint', 'phase'], buckets=LATENCY_BUCKETS
+    )
+    QUERIES = prometheus_client.Histogram(
+        'http_request_db_queries', 'Consultas por request en los requests muestreados',
+        ['endpoint'], buckets=QUERY_BUCKETS
+    )
+    # Pool de hashing de contraseñas (PasswordHasher). Se registran al momento
+    # de cada hash, así que con varios procesos también se suman
+    PASSWORD_POOL_TASKS = prometheus_client.Counter(
+        'password_pool_tasks_total', 'Hashes y verificaciones de contraseña', ['outcome']
+    )
+    _password_series = {outcome: PASSWORD_POOL_TASKS.labels(outcome) for outcome in ('completed', 'rejected')}
+    PASSWORD_POOL_WAIT = prometheus_client.Histogram(
+        'password_pool_queue_wait_seconds', 'Espera en la cola del pool de hashing',
+        buckets=LATENCY_BUCKETS
+    )
+    PASSWORD_POOL_HASH = prometheus_client.Histogram(
+        'password_pool_hash_seconds', 'Duración de cada hash o verificación',
+        buckets=LATENCY_BUCKETS
+    )
+    # Agrupación de GETs idénticos (SingleFlight): executed, coalesced, cached o
+    # unshared (esperó al primero pero su respuesta era streaming y se ejecutó aparte)
+    COALESCE_REQUESTS = prometheus_client.Counter(
+        'coalesce_requests_total', 'Requests por resultado de la agrupación', ['endpoint', 'outcome']
+    )
+    # Catálogo de compañías en memoria: hit (copia vigente) o reload (se recargó)
+    COMPANY_CATALOG_LOOKUPS = prometheus_client.Counter(
+        'company_catalog_lookups_total', 'Consultas al catálogo de compañías', ['outcome']
+    )
+    _catalog_series = {outcome: COMPANY_CATALOG_LOOKUPS.labels(outcome) for outcome in ('hit', 'reload')}
+
+
+# Series ya resueltas por etiquetas; labels() toma un lock y arma tuplas en cada llamada
+_endpoint_series = {}
+_request_series = {}
+
+
+def _series_for(endpoint):
+    series = _endpoint_series.get(endpoint)
+    if series is None:
+        series = _endpoint_series[endpoint] = (IN_FLIGHT.labels(endpoint), LATENCY.labels(endpoint))
+    return series
+
+
+def _requests_for(endpoint, method, status):
+    key = (endpoint, method, status)
+    counter = _request_series.get(key)
+    if counter is None:
+        counter = _request_series[key] = REQUESTS.labels(endpoint, method, str(status))
+    return counter
+
+
+def record_password_hash(queue_wait, hash_time):
+    """Un hash terminado en el pool de PasswordHasher"""
+    if prometheus_client is None:
+        return
+    _password_series['completed'].inc()
+    PASSWORD_POOL_WAIT.observe(queue_wait)
+    PASSWORD_POOL_HASH.observe(hash_time)
+
+
+def record_password_rejected():
+    """Un hash rechazado porque el pool estaba lleno (503)"""
+    if prometheus_client is not None:
+        _password_series['rejected'].inc()
+
+
+def record_coalesce(endpoint, outcome):
+    if prometheus_client is not None:
+        COALESCE_REQUESTS.labels(endpoint, outcome).inc()
+
+
+def record_company_catalog(outcome):
+    if prometheus_client is not None:
+        _catalog_series[outcome].inc()
+
+
+def _registry():
+    # Con gunicorn y varios procesos cada uno escribe sus valores en
+    # PROMETHEUS_MULTIPROC_DIR y aquí se suman los de todos
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def init_metrics(app):
+    """
+    Registra latencia, códigos de respuesta y requests en curso por endpoint, y
+    los tiempos de db/hash/serialize que mide la instrumentación de SQL (solo
+    en los requests muestreados). Se exponen en formato Prometheus en /metrics,
+    protegido con el token de METRICS_TOKEN (Authorization: Bearer ...); sin
+    token configurado la ruta responde 404.
+    """
+    if prometheus_client is None or not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_request_metrics():
+        endpoint = request.endpoint or 'not_found'
+        series = _series_for(endpoint)
+        series[0].inc()
+        # [endpoint, método, series, inicio, status]
+        g._metrics = [endpoint, request.method, series, time.perf_counter(), 500]
+
+    @app.after_request
+    def record_status(response):
+        state = g.get('_metrics')
+        if state is not None:
+            state[4] = response.status_code
+        return response
+
+    # teardown corre también con excepciones y, en streaming, al terminar el cuerpo
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        state = g.pop('_metrics', None)
+        if state is None:
+            return
+        endpoint, method, (in_flight, latency), started_at, status = state
+        if exc is not None:
+            status = 500
+
+        latency.observe(time.perf_counter() - started_at)
+        in_flight.dec()
+        _requests_for(endpoint, method, status).inc()
+
+        timings = g.get('request_timings')
+        if timings is not None:
+            QUERIES.labels(endpoint).observe(timings.queries)
+            PHASE.labels(endpoint, 'db').observe(timings.db_time)
+            for phase, seconds in timings.phases.items():
+                PHASE.labels(endpoint, phase).observe(seconds)
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if not token:
+            return Response('Not Found', status=404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized', status=401, headers={'WWW-Authenticate': 'Bearer'})
+        return Response(prometheus_client.generate_latest(_registry()),
+                        mimetype=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,44 @@
+import json
+
+from flask import request
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class PayloadError(ValueError):
+    """El cuerpo no es un arreglo JSON ni NDJSON válido"""
+
+
+def iter_request_items():
+    """
+    Itera los elementos del cuerpo del request: un arreglo JSON o NDJSON
+    (un objeto por línea, según el Content-Type). El NDJSON se lee del stream
+    línea por línea, sin cargar el cuerpo completo en memoria.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return iter_ndjson(request.stream)
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise PayloadError('Se esperaba un arreglo JSON o NDJSON')
+    return iter(data)
+
+
+def iter_ndjson(stream, strict=True, numbered=False):
+    """
+    Objetos de un NDJSON (stream binario), uno por línea. Una línea inválida
+    lanza PayloadError, o con strict=False produce None en su lugar para que
+    quien lee la reporte como error de esa fila y siga con las demás. Con
+    numbered=True produce (número de línea, objeto); las líneas vacías cuentan.
+    """
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            if strict:
+                raise PayloadError(f'La línea {number} no es JSON válido')
+            item = None
+        yield (number, item) if numbered else item
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """Parámetros de paginación inválidos (limit o cursor)"""
+
+
+def encode_cursor(last_id):
+    """Codifica el último id entregado como un cursor opaco"""
+    payload = json.dumps({'id': last_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor generado por encode_cursor y regresa el id"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        last_id = payload['id']
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeError):
+        raise PaginationError('El cursor no es válido')
+
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise PaginationError('El cursor no es válido')
+    return last_id
+
+
+def get_page_params(args):
+    """
+    Lee `limit` y `after` de los query params.
+    Regresa None si no se pidió paginación (comportamiento anterior: lista completa),
+    o una tupla (limit, after_id).
+    """
+    raw_limit = args.get('limit')
+    cursor = args.get('after')
+
+    if raw_limit is None and cursor is None:
+        return None
+
+    if raw_limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise PaginationError('El parámetro limit debe ser un número entero')
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise PaginationError(f'El parámetro limit debe estar entre 1 y {MAX_PAGE_SIZE}')
+
+    after_id = decode_cursor(cursor) if cursor else None
+    return limit, after_id
+
+
+def split_page(rows, limit):
+    """
+    Paginación por llave (keyset) ordenada por id: el query debe pedir
+    `WHERE id > :after ORDER BY id LIMIT :limit + 1`, así el costo de cada
+    página es el mismo sin importar qué tan profundo pagine el cliente.
+    Recibe esas filas (dicts) y regresa (rows, next_cursor); next_cursor es None
+    en la última página.
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['id'])
+    return rows, next_cursor
+
+
+def page_response(items, next_cursor, limit):
+    """Cuerpo estándar para las respuestas paginadas"""
+    return {
+        'items': items,
+        'limit': limit,
+        'next_cursor': next_cursor
+    }
@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt as _bcrypt
+from flask import current_app
+
+from app import bcrypt
+from app.utils.instrumentation import record_phase
+from app.utils.metrics import record_password_hash, record_password_rejected
+
+try:
+    import argon2
+except ImportError:  # pragma: no cover - argon2-cffi es opcional
+    argon2 = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows (solo desarrollo)
+    fcntl = None
+
+SCHEME_BCRYPT = 'bcrypt'
+SCHEME_ARGON2 = 'argon2'
+
+
+class HashPoolSaturated(Exception):
+    """El pool de hashing está lleno; el cliente debe reintentar más tarde"""
+
+
+class PasswordHasher:
+    """
+    Ejecuta bcrypt en un pool de hilos de tamaño fijo (bcrypt libera el GIL, así
+    que los hilos sí corren en paralelo) con un límite de solicitudes en espera.
+    Si el pool ya tiene PASSWORD_POOL_WORKERS + PASSWORD_POOL_MAX_QUEUE trabajos,
+    se rechaza de inmediato con HashPoolSaturated en lugar de acumular requests.
+
+    El límite solo entra en juego con varios requests por proceso (gunicorn con
+    GUNICORN_THREADS > 1 o uvicorn con ASGI_THREADS): con el worker sync de un
+    hilo cada proceso hashea una contraseña a la vez y nunca hay cola.
+    Los contadores de stats() también se exportan en /metrics (password_pool_*).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = current_app.config['PASSWORD_POOL_WORKERS']
+                    max_queue = current_app.config['PASSWORD_POOL_MAX_QUEUE']
+                    self._slots = threading.BoundedSemaphore(workers + max_queue)
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=workers, thread_name_prefix='password-hash'
+                    )
+        return self._executor
+
+    def _submit(self, fn, *args, wait=None):
+        executor = self._pool()
+        acquired = self._slots.acquire(timeout=wait) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            self.rejected += 1
+            record_password_rejected()
+            raise HashPoolSaturated()
+
+        queued_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished_at = time.perf_counter()
+                self._record(started_at - queued_at, finished_at - started_at)
+
+        try:
+            future = executor.submit(job)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        started_at = time.perf_counter()
+        try:
+            return self._submit(fn, *args).result()
+        finally:
+            record_phase('hash', time.perf_counter() - started_at)
+
+    def _record(self, queue_wait, hash_time):
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.hash_time_total += hash_time
+            self.hash_time_max = max(self.hash_time_max, hash_time)
+        record_password_hash(queue_wait, hash_time)
+
+    def hash(self, password):
+        """Genera el hash de `password` (str) con el esquema y costo configurados"""
+        if _scheme() == SCHEME_ARGON2:
+            return self._run(_argon2_hasher().hash, password)
+        rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+        return self._run(bcrypt.generate_password_hash, password, rounds).decode('utf-8')
+
+    def hash_many(self, passwords):
+        """
+        Genera los hashes de varias contraseñas en paralelo, en el mismo orden.
+        Para no dejar sin lugar a los logins, ocupa como máximo
+        PASSWORD_POOL_WORKERS lugares del pool a la vez y espera hasta
+        PASSWORD_POOL_BULK_WAIT segundos por cada lugar.
+        """
+        window = current_app.config['PASSWORD_POOL_WORKERS']
+        wait = current_app.config['PASSWORD_POOL_BULK_WAIT']
+        if _scheme() == SCHEME_ARGON2:
+            fn, extra = _argon2_hasher().hash, ()
+        else:
+            fn, extra = bcrypt.generate_password_hash, (current_app.config['BCRYPT_LOG_ROUNDS'],)
+
+        started_at = time.perf_counter()
+        futures = []
+        try:
+            for index, password in enumerate(passwords):
+                if index >= window:
+                    futures[index - window].result()
+                futures.append(self._submit(fn, password, *extra, wait=wait))
+
+            hashes = [future.result() for future in futures]
+        finally:
+            record_phase('hash', time.perf_counter() - started_at)
+        return [h.decode('utf-8') if isinstance(h, bytes) else h for h in hashes]
+
+    def check(self, hashed, password):
+        """Verifica `password` contra el hash guardado (bcrypt o argon2)"""
+        if hashed.startswith('$argon2'):
+            return self._run(_argon2_verify, hashed, password)
+        return self._run(bcrypt.check_password_hash, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """
+        True si el hash guardado no corresponde a la política actual (otro esquema
+        u otro costo). No calcula ningún hash, solo lee los parámetros.
+        """
+        if _scheme() == SCHEME_ARGON2:
+            return not hashed.startswith('$argon2') or _argon2_hasher().check_needs_rehash(hashed)
+        if not hashed.startswith('$2'):
+            return True
+        # Formato bcrypt: $2b$<costo>$<salt+hash>
+        try:
+            return int(hashed.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self):
+        completed = self.completed
+        return {
+            'completed': completed,
+            'rejected': self.rejected,
+            'queue_wait_avg_ms': self.queue_wait_total / completed * 1000 if completed else 0.0,
+            'queue_wait_max_ms': self.queue_wait_max * 1000,
+            'hash_time_avg_ms': self.hash_time_total / completed * 1000 if completed else 0.0,
+            'hash_time_max_ms': self.hash_time_max * 1000
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+def _scheme():
+    return current_app.config.get('PASSWORD_HASH_SCHEME', SCHEME_BCRYPT)
+
+
+_argon2_cache = {}
+
+
+def _argon2_hasher(time_cost=None):
+    if argon2 is None:
+        raise RuntimeError('PASSWORD_HASH_SCHEME=argon2 requiere el paquete argon2-cffi')
+    config = current_app.config
+    params = (
+        time_cost or config['ARGON2_TIME_COST'],
+        config['ARGON2_MEMORY_COST'],
+        config['ARGON2_PARALLELISM']
+    )
+    if params not in _argon2_cache:
+        _argon2_cache[params] = argon2.PasswordHasher(
+            time_cost=params[0], memory_cost=params[1], parallelism=params[2]
+        )
+    return _argon2_cache[params]
+
+
+def _argon2_verify(hashed, password):
+    try:
+        return argon2.PasswordHasher().verify(hashed, password)
+    except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+        return False
+
+
+def _time_ms(fn):
+    started_at = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started_at) * 1000
+
+
+def calibrate(target_ms, scheme=None):
+    """
+    Mide el tiempo de hash en esta máquina y regresa (costo, mediciones): el
+    costo más alto cuyo hash tarda como máximo `target_ms`. Para bcrypt el costo
+    es BCRYPT_LOG_ROUNDS; para argon2 es ARGON2_TIME_COST (con la memoria y el
+    paralelismo configurados). `mediciones` es una lista de (costo, ms).
+    """
+    scheme = scheme or _scheme()
+    timings = []
+
+    if scheme == SCHEME_ARGON2:
+        best = 1
+        for time_cost in range(1, 11):
+            hasher = _argon2_hasher(time_cost)
+            elapsed = _time_ms(lambda: hasher.hash('calibration'))
+            timings.append((time_cost, elapsed))
+            if elapsed > target_ms:
+                break
+            best = time_cost
+        return best, timings
+
+    # bcrypt: cada punto de costo duplica el tiempo, no tiene caso seguir al pasarse
+    best = 10
+    for rounds in range(10, 17):
+        elapsed = _time_ms(lambda: _bcrypt.hashpw(b'calibration', _bcrypt.gensalt(rounds)))
+        timings.append((rounds, elapsed))
+        if elapsed > target_ms:
+            break
+        best = rounds
+    return best, timings
+
+
+def load_calibration(path, scheme, target_ms):
+    """Costo guardado en `path` para este esquema y objetivo, o None"""
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get('scheme') != scheme or saved.get('target_ms') != target_ms:
+        return None
+    return saved.get('cost')
+
+
+def save_calibration(path, scheme, target_ms, cost):
+    """Guarda el costo en `path` (se reemplaza completo, nunca queda a medias)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'scheme': scheme, 'target_ms': target_ms, 'cost': cost}, f)
+    os.replace(tmp_path, path)
+
+
+def apply_calibration(app, target_ms):
+    """
+    Fija el costo del hash en la configuración de la app. Se calibra una sola
+    vez por máquina: el resultado se guarda en PASSWORD_HASH_CALIBRATION_FILE
+    y los demás workers (y los siguientes arranques) lo leen de ahí. Si cada
+    worker midiera por su cuenta podrían quedar costos distintos, y
+    needs_rehash() regeneraría los hashes en cada login según el worker.
+    Regresa (costo, mediciones); las mediciones van vacías si se leyó del archivo.
+    """
+    scheme = app.config.get('PASSWORD_HASH_SCHEME', SCHEME_BCRYPT)
+    path = app.config['PASSWORD_HASH_CALIBRATION_FILE']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    # Los workers que arrancan a la vez esperan al primero en vez de medir en paralelo
+    with open(f'{path}.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        cost, timings = load_calibration(path, scheme, target_ms), []
+        if cost is None:
+            with app.app_context():
+                cost, timings = calibrate(target_ms, scheme)
+            save_calibration(path, scheme, target_ms, cost)
+
+    if scheme == SCHEME_ARGON2:
+        app.config['ARGON2_TIME_COST'] = cost
+    else:
+        app.config['BCRYPT_LOG_ROUNDS'] = cost
+    return cost, timings
@@ -0,0 +1,88 @@
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+
+from app.utils.claims_cache import claims_versions
+
+# Versión de los claims de autorización dentro del JWT. Se incrementa cuando
+# cambia su forma o su significado: los tokens con otra versión se rechazan
+# con 401 y el cliente debe volver a iniciar sesión.
+CLAIMS_VERSION = 2
+
+SESSION_EXPIRED = 'La sesión expiró, vuelve a iniciar sesión'
+
+
+def claims_for(user):
+    """Claims adicionales que se guardan en el token al iniciar sesión"""
+    return {
+        'authz_v': CLAIMS_VERSION,
+        # Cambia con el rol, la desactivación o las membresías de un admin (User.claims_version)
+        'claims_v': user.claims_version,
+        'role_id': user.role_id,
+        'active': bool(user.active),
+        'company_ids': sorted(company.id for company in user.companies)
+    }
+
+
+class TokenClaims:
+    """Permisos del usuario actual leídos del JWT (vigentes si claims_v coincide)"""
+
+    def __init__(self, user_id, role_id, active, company_ids):
+        self.id = user_id
+        self.role_id = role_id
+        self.active = active
+        self.company_ids = frozenset(company_ids)
+
+    def has_role(self, *roles):
+        return self.role_id in roles
+
+    def missing_companies(self, company_ids):
+        """Regresa los ids de `company_ids` a los que el usuario no tiene acceso"""
+        return [company_id for company_id in company_ids if company_id not in self.company_ids]
+
+
+def current_claims():
+    """Claims del request actual; requiere un JWT ya verificado"""
+    if 'token_claims' not in g:
+        jwt_data = get_jwt()
+        g.token_claims = TokenClaims(
+            int(get_jwt_identity()),
+            jwt_data.get('role_id'),
+            jwt_data.get('active', False),
+            jwt_data.get('company_ids', ())
+        )
+    return g.token_claims
+
+
+def require_role(*roles, message='No tienes permisos para realizar esta acción'):
+    """
+    Verifica el JWT y los permisos del usuario con los claims del token, sin
+    consultar la base de datos: si sus permisos cambiaron después del login
+    (claims_version en la copia del worker, ver claims_cache), el token se
+    rechaza con 401.
+    Sin roles, basta con un token vigente de un usuario activo.
+        @require_role(ROLE_SUPERADMIN, ROLE_ADMIN)
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+
+            jwt_data = get_jwt()
+            if jwt_data.get('authz_v') != CLAIMS_VERSION:
+                return jsonify({'message': SESSION_EXPIRED}), 401
+
+            claims = current_claims()
+            if jwt_data.get('claims_v') != claims_versions.get(claims.id):
+                return jsonify({'message': SESSION_EXPIRED}), 401
+
+            if not claims.active:
+                return jsonify({'message': 'Tu usuario está desactivado'}), 403
+
+            if roles and not claims.has_role(*roles):
+                return jsonify({'message': message}), 403
+
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,151 @@
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(limit):
+    """'5/minute' -> (tokens por segundo, capacidad de la cubeta)"""
+    count, period = limit.split('/')
+    count = int(count)
+    return count / _PERIODS[period], count
+
+
+class RateLimitStore:
+    """
+    Cubetas de tokens guardadas en un archivo SQLite local, compartido por todos
+    los workers de gunicorn del mismo host (no requiere Redis). Cada consulta es
+    una transacción corta sobre una tabla con llave primaria, del orden de decenas
+    de microsegundos.
+    """
+
+    CLEANUP_EVERY = 1000
+
+    def __init__(self):
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        path = current_app.config.get('RATE_LIMIT_STORAGE') or os.path.join(
+            tempfile.gettempdir(), 'flask-api-rate-limit.db'
+        )
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != path:
+            conn = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.path = path
+        return conn
+
+    def take(self, key, rate, capacity):
+        """
+        Consume un token de la cubeta `key`. Regresa 0 si se permitió o los
+        segundos que faltan para que haya un token disponible.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / rate
+
+            conn.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._calls += 1
+        if self._calls % self.CLEANUP_EVERY == 0:
+            # Una cubeta sin uso por un día ya está llena; se puede borrar
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+        return retry_after
+
+
+store = RateLimitStore()
+
+
+def _client_ip():
+    trusted_proxies = current_app.config.get('RATE_LIMIT_TRUSTED_PROXIES', 0)
+    if trusted_proxies and len(request.access_route) >= trusted_proxies:
+        # La IP que agregó el proxy de confianza más externo
+        return request.access_route[-trusted_proxies]
+    return request.remote_addr
+
+
+def _request_email():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and isinstance(data.get('email'), str):
+        return data['email'].strip().lower()
+    return None
+
+
+def _request_identity():
+    verify_jwt_in_request(optional=True)
+    return get_jwt_identity()
+
+
+def rate_limit(name, per_ip=None, per_email=None, per_identity=None):
+    """
+    Limita la ruta con cubetas de tokens por IP, por email del cuerpo JSON y/o
+    por identidad del JWT, p. ej.:
+        @rate_limit('login', per_ip='20/minute', per_email='5/minute')
+    Las solicitudes rechazadas reciben 429 con Retry-After antes de ejecutar la
+    ruta, es decir, antes de cualquier consulta a la base de datos o bcrypt.
+    Si el archivo de cubetas no responde, el límite no se aplica (falla abierto).
+    """
+    limits = [
+        (kind, parse_limit(limit), key_fn)
+        for kind, limit, key_fn in (
+            ('ip', per_ip, _client_ip),
+            ('email', per_email, _request_email),
+            ('identity', per_identity, _request_identity)
+        )
+        if limit
+    ]
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_app.config.get('RATE_LIMIT_ENABLED', True):
+                for kind, (rate, capacity), key_fn in limits:
+                    value = key_fn()
+                    if value is None:
+                        continue
+                    try:
+                        retry_after = store.take(f'{name}:{kind}:{value}', rate, capacity)
+                    except sqlite3.OperationalError as e:
+                        # Archivo bloqueado más de 1 s o inaccesible: se deja pasar
+                        # la solicitud en vez de responder 500
+                        current_app.logger.warning(f'Límite de solicitudes no disponible ({e})')
+                        continue
+                    if retry_after:
+                        response = jsonify({'message': 'Demasiadas solicitudes, intenta de nuevo más tarde'})
+                        response.headers['Retry-After'] = str(math.ceil(retry_after))
+                        return response, 429
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
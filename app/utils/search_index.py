@@ -0,0 +1,187 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from flask import current_app
+
+from app.models.cache_versions import get_versions
+
+# Rango de cada coincidencia: igual a un campo, prefijo de un campo, prefijo de
+# una palabra del campo o subcadena. Los mismos valores usa la búsqueda en SQL.
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+# Con menos letras solo se busca por prefijo (los trigramas de Postgres tampoco
+# sirven para subcadenas más cortas)
+SUBSTRING_MIN_LENGTH = 3
+# Documentos que se revisan buscando subcadenas; con más, el orden entre las
+# coincidencias de subcadena es aproximado
+MAX_SUBSTRING_CANDIDATES = 2000
+
+# Mayor que cualquier carácter: query + _MAX_CHAR acota el rango de prefijos
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def rank(fields, query):
+    """Mejor rango de `query` en `fields` (textos ya en minúsculas) o None"""
+    best = None
+    for field in fields:
+        if not field or query not in field:
+            continue
+        if field == query:
+            return RANK_EXACT
+        if field.startswith(query):
+            value = RANK_PREFIX
+        elif f' {query}' in field:
+            value = RANK_WORD_PREFIX
+        else:
+            value = RANK_SUBSTRING
+        best = value if best is None else min(best, value)
+    return best
+
+
+class SearchIndex:
+    """
+    Índice en memoria (por worker) para la búsqueda cuando la base no es Postgres.
+
+    `loader()` regresa una lista de (documento, campos, grupos): el dict que se
+    responde, los textos donde se busca y los ids de compañía que deciden quién
+    puede verlo. Los documentos se guardan ordenados con `sort_key`, así que
+    entre coincidencias del mismo rango gana la de menor posición.
+
+    - Prefijos: bisect sobre la lista ordenada de todos los campos; el rango
+      (igual o prefijo) sale de la posición, sin revisar cada documento.
+    - Subcadenas: str.find sobre todos los campos concatenados, en orden de
+      documento, solo si los prefijos no alcanzan para `limit`.
+
+    Igual que CompanyCatalog, se reconstruye cuando cambia alguno de los
+    contadores `versions` de cache_versions, revisándolos como máximo cada
+    SEARCH_INDEX_MAX_STALENESS segundos.
+    """
+
+    def __init__(self, versions, loader, sort_key):
+        self._version_names = versions
+        self._loader = loader
+        self._sort_key = sort_key
+        self._lock = threading.Lock()
+        self._versions = None
+        self._checked_at = 0.0
+        self._docs = []
+        self._fields = []
+        self._groups = []
+        self._tokens = []
+        self._token_docs = []
+        self._text = ''
+        self._starts = []
+        self.rebuilds = 0
+
+    def _ensure_fresh(self):
+        max_staleness = current_app.config.get('SEARCH_INDEX_MAX_STALENESS', 5)
+        now = time.monotonic()
+        if self._versions is not None and now - self._checked_at < max_staleness:
+            return
+
+        with self._lock:
+            versions = get_versions(*self._version_names)
+            if versions != self._versions:
+                self._build(self._loader())
+                self._versions = versions
+            self._checked_at = now
+
+    def _build(self, entries):
+        entries = sorted(entries, key=lambda entry: self._sort_key(entry[0]))
+        docs, fields, groups, tokens, parts, starts = [], [], [], [], [], []
+        offset = 0
+        for index, (doc, doc_fields, doc_groups) in enumerate(entries):
+            lowered = tuple((field or '').lower().replace('\n', ' ') for field in doc_fields)
+            docs.append(doc)
+            fields.append(lowered)
+            groups.append(frozenset(doc_groups))
+            tokens.extend((field, index) for field in lowered if field)
+            text = '\n'.join(lowered) + '\n'
+            parts.append(text)
+            starts.append(offset)
+            offset += len(text)
+        tokens.sort()
+
+        self._docs, self._fields, self._groups = docs, fields, groups
+        self._tokens = [token for token, _ in tokens]
+        self._token_docs = [index for _, index in tokens]
+        self._text = ''.join(parts)
+        self._starts = starts
+        self.rebuilds += 1
+
+    def _substring_candidates(self, query):
+        text, starts = self._text, self._starts
+        position = text.find(query)
+        while position != -1:
+            index = bisect_right(starts, position) - 1
+            yield index
+            # Una sola coincidencia por documento: se sigue en el siguiente
+            following = index + 1
+            if following == len(starts):
+                return
+            position = text.find(query, starts[following])
+
+    def search(self, query, limit, visible_groups=None):
+        """
+        Hasta `limit` documentos que contienen `query`, del mejor rango al peor.
+        Con `visible_groups` (conjunto de ids de compañía) solo se consideran los
+        documentos con algún grupo en común.
+        """
+        self._ensure_fresh()
+        query = query.lower()
+        if '\n' in query:
+            return []
+
+        groups = self._groups
+
+        def first_visible(candidates, count):
+            if visible_groups is None:
+                return heapq.nsmallest(count, candidates)
+            found = []
+            for index in sorted(candidates):
+                if groups[index] & visible_groups:
+                    found.append(index)
+                    if len(found) == count:
+                        break
+            return found
+
+        tokens, token_docs = self._tokens, self._token_docs
+        start = bisect_left(tokens, query)
+        exact_end = bisect_right(tokens, query, start)
+        prefix_end = bisect_left(tokens, query + _MAX_CHAR, exact_end)
+        exact = set(token_docs[start:exact_end])
+        prefix = set(token_docs[exact_end:prefix_end]) - exact
+
+        results = first_visible(exact, limit)
+        results += first_visible(prefix, limit - len(results))
+
+        if len(results) < limit and len(query) >= SUBSTRING_MIN_LENGTH:
+            # Los documentos llegan en orden, así que basta juntar `missing` de cada rango
+            missing = limit - len(results)
+            word_prefix, substring = [], []
+            for scanned, index in enumerate(self._substring_candidates(query)):
+                if scanned >= MAX_SUBSTRING_CANDIDATES or len(word_prefix) == missing:
+                    break
+                if index in exact or index in prefix:
+                    continue
+                if visible_groups is not None and not (groups[index] & visible_groups):
+                    continue
+                if rank(self._fields[index], query) == RANK_WORD_PREFIX:
+                    word_prefix.append(index)
+                elif len(substring) < missing:
+                    substring.append(index)
+            results += (word_prefix + substring)[:missing]
+
+        return [self._docs[index] for index in results]
+
+    def stats(self):
+        return {
+            'documents': len(self._docs),
+            'rebuilds': self.rebuilds,
+            'versions': self._versions
+        }
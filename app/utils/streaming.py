@@ -0,0 +1,105 @@
+import csv
+import io
+from datetime import datetime
+
+from flask import Response, current_app, stream_with_context
+
+# Tamaño aproximado de cada pedazo enviado al cliente
+STREAM_CHUNK_SIZE = 64 * 1024
+# Filas que se piden a la base de datos por cada viaje del cursor del servidor
+STREAM_BATCH_SIZE = 500
+
+
+def stream_json_array(rows, serialize=None):
+    """
+    Regresa una respuesta que codifica `rows` como un arreglo JSON fila por fila.
+    `rows` puede ser cualquier iterable (idealmente un resultado con yield_per), así
+    la memoria del worker no crece con el tamaño de la tabla y el primer byte
+    sale en cuanto se codifica el primer pedazo. El cuerpo es el mismo que
+    regresaría jsonify() con la lista completa.
+    """
+    def generate():
+        dumps = current_app.json.dumps
+        chunk = ['[']
+        size = 1
+        first = True
+
+        for row in rows:
+            item = dumps(serialize(row) if serialize else row, separators=(',', ':'))
+            if not first:
+                item = ',' + item
+            first = False
+
+            chunk.append(item)
+            size += len(item)
+            if size >= STREAM_CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+
+        chunk.append(']\n')
+        yield ''.join(chunk)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def _attachment(response, filename):
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _csv_value(value, format_datetime):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, (list, tuple)):
+        # Las listas van separadas por ';', como las lee la importación
+        return ';'.join(str(item) for item in value)
+    return value
+
+
+def stream_csv(rows, columns, filename):
+    """
+    Descarga CSV en pedazos: escribe el encabezado `columns` y una línea por
+    dict de `rows`, con las fechas en la misma zona que las respuestas JSON.
+    """
+    def generate():
+        format_datetime = current_app.json.format_datetime
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+        for row in rows:
+            writer.writerow([_csv_value(row[column], format_datetime) for column in columns])
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    return _attachment(response, filename)
+
+
+def stream_ndjson(rows, filename):
+    """Descarga NDJSON en pedazos: un objeto JSON por línea"""
+    def generate():
+        dumps = current_app.json.dumps
+        chunk = []
+        size = 0
+
+        for row in rows:
+            line = dumps(row, separators=(',', ':')) + '\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= STREAM_CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+
+        yield ''.join(chunk)
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    return _attachment(response, filename)
@@ -0,0 +1,17 @@
+import os
+
+from a2wsgi import WSGIMiddleware
+
+# Hilos por proceso si no se define ASGI_THREADS
+DEFAULT_ASGI_THREADS = 32
+
+# Se fija antes de crear la app: el pool de conexiones (app/utils/db_pool.py) se
+# dimensiona con ASGI_THREADS, así que debe ver el mismo valor que usa el middleware
+os.environ.setdefault('ASGI_THREADS', str(DEFAULT_ASGI_THREADS))
+
+from run import app as wsgi_app  # noqa: E402
+
+# Entrada ASGI (uvicorn asgi:app). Las vistas siguen siendo las mismas de Flask:
+# cada request corre en un pool de ASGI_THREADS hilos, mientras el event loop
+# atiende las conexiones (keep-alive, clientes lentos) sin ocupar un hilo.
+app = WSGIMiddleware(wsgi_app, workers=int(os.environ['ASGI_THREADS']))
@@ -0,0 +1,28 @@
+import os
+
+# Configuración de gunicorn (WSGI). Por defecto igual que antes: un proceso sync.
+# Con GUNICORN_THREADS > 1 cada proceso atiende varios requests con hilos (gthread).
+# Con el worker sync el pool de bcrypt nunca se llena (un request por proceso), así
+# que el 503 por saturación (PASSWORD_POOL_MAX_QUEUE) solo aplica con hilos.
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+# create_app no abre conexiones ni hilos, así que la app se puede construir una
+# vez en el master y los workers nacen ya importados (fork)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+
+# Métricas con varios procesos: cada worker escribe en PROMETHEUS_MULTIPROC_DIR
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,32 @@
+"""Tabla cache_versions para invalidar cachés entre workers
+
+Revision ID: 3f1b7c2d9e40
+Revises: 77559306c971
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1b7c2d9e40'
+down_revision = '77559306c971'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las bases creadas con `flask init-db` (create_all) ya tienen la tabla
+    if 'cache_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('cache_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_versions')
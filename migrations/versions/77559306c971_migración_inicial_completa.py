@@ -17,16 +17,69 @@ depends_on = None
 
 
 def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_table('roles')
-    # ### end Alembic commands ###
+    # Esquema base (roles, usuarios, compañías y membresías). Las bases creadas
+    # antes con db.create_all() ya tienen estas tablas y no se tocan.
+    # Los índices de las llaves foráneas se crean en la revisión d2a6c8e4f1b9.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+
+    if 'roles' not in existing:
+        op.create_table('roles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+
+    if 'users' not in existing:
+        # users y companies se referencian mutuamente: en SQLite la llave a
+        # companies va en la tabla, en los demás motores se agrega al final
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password', sa.String(length=128), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=True),
+        sa.Column('lastname', sa.String(length=120), nullable=True),
+        sa.Column('role_id', sa.Integer(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('primary_company_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['role_id'], ['roles.id']),
+        *([sa.ForeignKeyConstraint(['primary_company_id'], ['companies.id'])] if sqlite else []),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+        )
+
+    if 'companies' not in existing:
+        op.create_table('companies',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.String(length=355), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+        if 'users' not in existing and not sqlite:
+            op.create_foreign_key('users_primary_company_id_fkey', 'users', 'companies',
+                                  ['primary_company_id'], ['id'])
+
+    if 'user_companies' not in existing:
+        op.create_table('user_companies',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id', 'company_id')
+        )
 
 
 def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    op.create_table('roles',
-    sa.Column('id', sa.INTEGER(), autoincrement=True, nullable=False),
-    sa.Column('name', sa.VARCHAR(length=100), autoincrement=False, nullable=False),
-    sa.PrimaryKeyConstraint('id', name='roles_pk')
-    )
-    # ### end Alembic commands ###
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('users_primary_company_id_fkey', 'users', type_='foreignkey')
+    op.drop_table('user_companies')
+    op.drop_table('companies')
+    op.drop_table('users')
+    op.drop_table('roles')
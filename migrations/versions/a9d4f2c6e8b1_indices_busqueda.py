@@ -0,0 +1,51 @@
+"""Índices de trigramas y prefijos para la búsqueda (solo Postgres)
+
+Revision ID: a9d4f2c6e8b1
+Revises: e7f3b9a1c5d2
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4f2c6e8b1'
+down_revision = 'e7f3b9a1c5d2'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = [
+    ('users', 'name'),
+    ('users', 'lastname'),
+    ('users', 'email'),
+    ('companies', 'name'),
+]
+
+
+def _indexes():
+    for table, column in SEARCH_COLUMNS:
+        expression = sa.text(f'lower({column}) gin_trgm_ops')
+        yield f'ix_{table}_{column}_trgm', table, expression, {'postgresql_using': 'gin'}
+        yield f'ix_{table}_{column}_prefix', table, sa.text(f'lower({column}) text_pattern_ops'), {}
+
+
+def upgrade():
+    # En los demás motores la búsqueda usa el índice en memoria
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table, expression, options in _indexes():
+            op.create_index(name, table, [expression], postgresql_concurrently=True,
+                            if_not_exists=True, **options)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in _indexes():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,33 @@
+"""Roles base (superadmin, admin, user)
+
+Revision ID: b5e1d7a3c902
+Revises: 8c4e2a1f6b73
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1d7a3c902'
+down_revision = '8c4e2a1f6b73'
+branch_labels = None
+depends_on = None
+
+ROLES = {1: 'superadmin', 2: 'admin', 3: 'user'}
+
+
+def upgrade():
+    # Antes se insertaban en cada arranque (init_db); ahora es parte del esquema
+    roles = sa.table('roles', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    connection = op.get_bind()
+    existing = set(connection.execute(sa.select(roles.c.id)).scalars())
+    missing = [{'id': role_id, 'name': name} for role_id, name in ROLES.items() if role_id not in existing]
+    if missing:
+        op.bulk_insert(roles, missing)
+
+
+def downgrade():
+    # Los roles pueden estar referenciados por usuarios; no se borran
+    pass
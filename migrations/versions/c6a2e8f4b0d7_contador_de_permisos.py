@@ -0,0 +1,45 @@
+"""Índice de users.claims_version y contador `claims` en cache_versions
+
+Revision ID: c6a2e8f4b0d7
+Revises: f4b8d2e6a0c3
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a2e8f4b0d7'
+down_revision = 'f4b8d2e6a0c3'
+branch_labels = None
+depends_on = None
+
+users = sa.table('users', sa.column('claims_version', sa.Integer))
+cache_versions = sa.table('cache_versions', sa.column('name', sa.String),
+                          sa.column('version', sa.Integer))
+
+
+def upgrade():
+    connection = op.get_bind()
+    postgresql = connection.dialect.name == 'postgresql'
+
+    # claims_version ahora toma el valor del contador `claims`; se arranca en el
+    # máximo actual para que el siguiente cambio de permisos siempre sea mayor
+    highest = connection.execute(sa.select(sa.func.max(users.c.claims_version))).scalar() or 0
+    current = connection.execute(
+        sa.select(cache_versions.c.version).where(cache_versions.c.name == 'claims')
+    ).scalar()
+    if current is None:
+        op.execute(cache_versions.insert().values(name='claims', version=highest))
+    elif current < highest:
+        op.execute(cache_versions.update().where(cache_versions.c.name == 'claims')
+                   .values(version=highest))
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_claims_version', 'users', ['claims_version'],
+                        postgresql_concurrently=postgresql, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_claims_version', table_name='users', if_exists=True)
@@ -0,0 +1,55 @@
+"""Índices para las llaves foráneas y membresías por compañía
+
+Revision ID: d2a6c8e4f1b9
+Revises: b5e1d7a3c902
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6c8e4f1b9'
+down_revision = 'b5e1d7a3c902'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_users_role_id', 'users', ['role_id']),
+    ('ix_users_primary_company_id', 'users', ['primary_company_id']),
+    ('ix_companies_user_id', 'companies', ['user_id']),
+    # La llave primaria (user_id, company_id) solo sirve para buscar por usuario
+    ('ix_user_companies_company_id_user_id', 'user_companies', ['company_id', 'user_id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+        return
+
+    # CREATE INDEX CONCURRENTLY no bloquea escrituras pero no puede correr dentro
+    # de una transacción. Si una ejecución anterior se interrumpió, el índice
+    # quedó inválido: se borra y se vuelve a crear.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            invalid = op.get_bind().execute(sa.text(
+                'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+                'WHERE pg_class.relname = :name AND NOT pg_index.indisvalid'
+            ), {'name': name}).first()
+            if invalid:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,87 @@
+"""Emails normalizados y único sin distinguir mayúsculas (lower(email))
+
+Revision ID: e7f3b9a1c5d2
+Revises: d2a6c8e4f1b9
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7f3b9a1c5d2'
+down_revision = 'd2a6c8e4f1b9'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+BATCH_SIZE = 5000
+EMAIL_LENGTH = 120
+
+users = sa.table('users', sa.column('id', sa.Integer), sa.column('email', sa.String),
+                 sa.column('active', sa.Boolean))
+normalized = sa.func.lower(sa.func.trim(users.c.email))
+
+
+def _deduplicate(connection):
+    """
+    Cuentas cuyo email solo difiere en mayúsculas o espacios: se conserva la más
+    antigua (menor id) y las demás se renombran a dup<id>-<email> y se desactivan.
+    No se borra nada porque pueden tener compañías, membresías o trabajos.
+    """
+    groups = connection.execute(
+        sa.select(normalized).group_by(normalized).having(sa.func.count() > 1)
+    ).scalars().all()
+    renamed = 0
+    for email in groups:
+        ids = connection.execute(
+            sa.select(users.c.id).where(normalized == email).order_by(users.c.id)
+        ).scalars().all()
+        for user_id in ids[1:]:
+            connection.execute(users.update().where(users.c.id == user_id).values(
+                email=f'dup{user_id}-{email}'[:EMAIL_LENGTH], active=False
+            ))
+            renamed += 1
+    if renamed:
+        logger.info(f'Emails duplicados renombrados y desactivados: {renamed}')
+
+
+def _backfill(connection):
+    """Guarda los emails normalizados, en lotes por id para no bloquear la tabla"""
+    last_id = connection.execute(sa.select(sa.func.max(users.c.id))).scalar() or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        connection.execute(users.update().where(
+            users.c.id >= start, users.c.id < start + BATCH_SIZE, users.c.email != normalized
+        ).values(email=normalized))
+
+
+def upgrade():
+    connection = op.get_bind()
+    postgresql = connection.dialect.name == 'postgresql'
+
+    _deduplicate(connection)
+    # Cada lote se confirma por separado (en Postgres el índice además se crea CONCURRENTLY)
+    with op.get_context().autocommit_block():
+        _backfill(connection)
+        op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=True,
+                        postgresql_concurrently=postgresql, if_not_exists=True)
+
+    # La restricción unique sobre email (sensible a mayúsculas) queda redundante.
+    # En SQLite es un índice automático que solo se quita reconstruyendo la tabla; se deja.
+    if postgresql:
+        for constraint in sa.inspect(connection).get_unique_constraints('users'):
+            if constraint['column_names'] == ['email']:
+                op.drop_constraint(constraint['name'], 'users', type_='unique')
+
+
+def downgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    if postgresql:
+        op.create_unique_constraint('users_email_key', 'users', ['email'])
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_email_lower', table_name='users',
+                      postgresql_concurrently=postgresql, if_exists=True)
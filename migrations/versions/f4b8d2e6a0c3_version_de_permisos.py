@@ -0,0 +1,32 @@
+"""Columna users.claims_version para invalidar tokens al cambiar permisos
+
+Revision ID: f4b8d2e6a0c3
+Revises: a9d4f2c6e8b1
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d2e6a0c3'
+down_revision = 'a9d4f2c6e8b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las bases creadas con `flask init-db` (create_all) ya tienen la columna
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')]
+    if 'claims_version' in columns:
+        return
+
+    # Con server_default no se reescribe la tabla (Postgres 11+) ni hay que rellenar filas
+    op.add_column('users', sa.Column('claims_version', sa.Integer(), nullable=False,
+                                     server_default='0'))
+
+
+def downgrade():
+    # Sin batch_alter_table: reconstruir la tabla en SQLite perdería ix_users_email_lower
+    op.drop_column('users', 'claims_version')
@@ -1,15 +1,9 @@
 import os
-from app import app, register_blueprints, init_db
+from app import create_app
 
-
-
-try:
-    init_db()
-except Exception as e:
-    print(f"Error al inicializar la base de datos: {str(e)}")
-
-# Registrar blueprints antes de ejecutar la aplicación
-register_blueprints()
+# Las tablas y los roles base se crean con `flask init-db` (o `flask db upgrade`)
+# antes de arrancar; los workers solo construyen la app
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 8080))
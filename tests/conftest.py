@@ -0,0 +1,12 @@
+import pytest
+
+from app.utils.claims_cache import claims_versions
+from app.utils.company_catalog import company_catalog
+
+
+@pytest.fixture(autouse=True)
+def fresh_worker_caches():
+    """Cada prueba usa su propia base de datos: las copias por worker empiezan vacías"""
+    claims_versions.__init__()
+    company_catalog.__init__()
+    yield
@@ -0,0 +1,78 @@
+"""
+Solicitudes GET idénticas y simultáneas deben ejecutar la ruta una sola vez,
+también cuando la respuesta se genera en streaming.
+"""
+import threading
+import time
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app.routes.companies as companies_routes
+from app import create_app, db, init_db
+from app.models.companies import Company
+from app.models.roles import ROLE_SUPERADMIN
+from app.models.users import User
+from app.utils.permissions import claims_for
+
+CLIENTS = 6
+
+
+@pytest.mark.parametrize('streaming', [True, False], ids=['stream', 'buffered'])
+def test_concurrent_company_lists_run_the_view_once(tmp_path, monkeypatch, streaming):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "coalesce.db"}',
+        'STREAM_LIST_RESPONSES': streaming,
+        'RATE_LIMIT_ENABLED': False,
+        'METRICS_ENABLED': False,
+        'JOB_RUNNER': 'external',
+        # Cada solicitud en espera conserva su conexión hasta terminar
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': CLIENTS, 'max_overflow': 0},
+    })
+    with app.app_context():
+        init_db()
+        superadmin = User(email='su@example.com', password='x', name='Su', role_id=ROLE_SUPERADMIN)
+        db.session.add(superadmin)
+        db.session.flush()
+        db.session.add_all([Company(name=f'Compañía {i}', description='d', user_id=superadmin.id)
+                            for i in range(5)])
+        db.session.commit()
+        token = create_access_token(identity=str(superadmin.id),
+                                    additional_claims=claims_for(superadmin))
+
+    # La primera ejecución espera a que las demás solicitudes ya estén en vuelo
+    calls = []
+    release = threading.Event()
+
+    def slow(fetch):
+        def wrapper(*args, **kwargs):
+            calls.append(args)
+            release.wait(5)
+            return fetch(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(companies_routes, 'iter_companies', slow(companies_routes.iter_companies))
+    monkeypatch.setattr(companies_routes, 'fetch_companies', slow(companies_routes.fetch_companies))
+
+    start = threading.Barrier(CLIENTS)
+    responses = []
+
+    def request():
+        client = app.test_client()
+        start.wait()
+        response = client.get('/api/companies/all', headers={'Authorization': f'Bearer {token}'})
+        responses.append((response.status_code, response.get_data()))
+
+    threads = [threading.Thread(target=request) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(responses) == CLIENTS
+    assert {status for status, _ in responses} == {200}
+    assert len({body for _, body in responses}) == 1
@@ -0,0 +1,151 @@
+"""
+Las listas completas y las rutas que serializan con User.to_dict() deben hacer
+un número fijo de consultas sin importar cuántas filas regresan (sin N+1).
+Correr con `python -m pytest` desde la raíz.
+"""
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app, db, init_db
+from app.models.companies import Company
+from app.models.roles import ROLE_SUPERADMIN, ROLE_USER
+from app.models.users import User
+from app.utils.permissions import claims_for
+
+ROWS = 10
+# Menos filas que un lote de iter_users/iter_companies (500): con más, las
+# respuestas en streaming hacen una consulta extra por lote, como se espera
+SCALE = 10
+
+
+def _seed(users, companies):
+    """Superadmin + `users` usuarios con dos compañías cada uno"""
+    superadmin = User(email='su@example.com', password='x', name='Su', role_id=ROLE_SUPERADMIN)
+    db.session.add(superadmin)
+    db.session.flush()
+
+    rows = [Company(name=f'Compañía {i}', description='d', user_id=superadmin.id)
+            for i in range(companies)]
+    db.session.add_all(rows)
+    db.session.flush()
+
+    for i in range(users):
+        user = User(email=f'user{i}@example.com', password='x', name=f'Usuario {i}',
+                    lastname='Prueba', role_id=ROLE_USER)
+        user.companies = [rows[i % companies], rows[(i + 1) % companies]]
+        user.primary_company_id = rows[i % companies].id
+        db.session.add(user)
+    db.session.commit()
+    return superadmin
+
+
+def _create_app(database, streaming=False):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+        'STREAM_LIST_RESPONSES': streaming,
+        'RATE_LIMIT_ENABLED': False,
+        'METRICS_ENABLED': False,
+        'JOB_RUNNER': 'external',
+    })
+
+
+def _token(user):
+    return {'Authorization': 'Bearer ' + create_access_token(identity=str(user.id),
+                                                             additional_claims=claims_for(user))}
+
+
+def _request(app, method, path, headers, json=None):
+    """(respuesta, consultas) de un request; antes se hace uno igual para cargar los cachés del worker"""
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+    client.get('/api/users/me', headers=headers)
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.open(path, method=method, headers=headers, json=json)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response, len(statements)
+
+
+def _count_queries(database, seed_size, path, streaming):
+    """(filas, consultas) de un GET a `path` sobre una base nueva con `seed_size` usuarios"""
+    app = _create_app(database, streaming)
+    with app.app_context():
+        init_db()
+        headers = _token(_seed(users=seed_size, companies=seed_size))
+
+    response, queries = _request(app, 'GET', path, headers)
+    assert response.status_code == 200
+    return len(response.get_json()), queries
+
+
+@pytest.mark.parametrize('streaming', [True, False], ids=['stream', 'buffered'])
+@pytest.mark.parametrize('path', ['/api/users/all', '/api/companies/all'])
+def test_list_query_count_does_not_grow_with_rows(tmp_path, path, streaming):
+    small_rows, small_queries = _count_queries(tmp_path / 'small.db', ROWS, path, streaming)
+    large_rows, large_queries = _count_queries(tmp_path / 'large.db', ROWS * SCALE, path, streaming)
+
+    assert large_rows > small_rows
+    assert large_queries == small_queries
+
+
+def _seed_member(companies):
+    """Superadmin + un usuario en `companies` compañías, cada una con otro contacto"""
+    superadmin = User(email='su@example.com', password='x', name='Su', role_id=ROLE_SUPERADMIN)
+    db.session.add(superadmin)
+    db.session.flush()
+
+    rows = []
+    for i in range(companies):
+        contact = User(email=f'contact{i}@example.com', password='x', name=f'Contacto {i}',
+                       role_id=ROLE_USER)
+        db.session.add(contact)
+        db.session.flush()
+        rows.append(Company(name=f'Compañía {i}', description='d', user_id=contact.id))
+    db.session.add_all(rows)
+    db.session.flush()
+
+    member = User(email='member@example.com', password='x', name='Miembro', role_id=ROLE_USER,
+                  companies=rows, primary_company_id=rows[0].id)
+    db.session.add(member)
+    db.session.commit()
+    return superadmin, member, [company.id for company in rows]
+
+
+def _count_detail_queries(database, companies, action):
+    """(compañías en la respuesta, consultas) de `action` con un usuario en `companies` compañías"""
+    app = _create_app(database)
+    with app.app_context():
+        init_db()
+        superadmin, member, company_ids = _seed_member(companies)
+        as_superadmin, as_member = _token(superadmin), _token(member)
+        requests = {
+            'me': ('GET', '/api/users/me', as_member, None),
+            'get': ('GET', f'/api/users/{member.id}', as_superadmin, None),
+            'update': ('PUT', f'/api/users/{member.id}', as_superadmin, {'name': 'Otro'}),
+            'create': ('POST', '/api/users/create', as_superadmin,
+                       {'email': 'new@example.com', 'password': 'x', 'companies': company_ids}),
+        }
+
+    method, path, headers, body = requests[action]
+    response, queries = _request(app, method, path, headers, body)
+    assert response.status_code in (200, 201)
+    return len(response.get_json()['companies']), queries
+
+
+@pytest.mark.parametrize('action', ['me', 'get', 'update', 'create'])
+def test_user_detail_query_count_does_not_grow_with_companies(tmp_path, action):
+    small_rows, small_queries = _count_detail_queries(tmp_path / 'small.db', ROWS, action)
+    large_rows, large_queries = _count_detail_queries(tmp_path / 'large.db', ROWS * SCALE, action)
+
+    assert large_rows > small_rows
+    assert large_queries == small_queries